@@ -22,73 +22,221 @@
 
 
 import bpy, bmesh
+import numpy as np
+from itertools import combinations
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from mathutils import Vector, Matrix
 from math import radians
 from bpy.types import Operator
 from bpy.props import EnumProperty
-from .utils import make_active_only, get_bbox_and_dimensions, bake_collision_object
+from .utils import report, make_active, bake_collision_object, get_vert_positions, get_selected_vert_mask
+
+
+collision_prefixes = ('UBX_', 'USP_', 'UCP_', 'UCX_')
+
+
+def is_collision_obj(obj):
+    return obj.name.startswith(collision_prefixes)
+
+
+# returns bbox center and dimensions of an (n, 3) position array
+def fit_bbox(positions):
+    if len(positions) == 0:
+        return (0.0, 0.0, 0.0), (0.0, 0.0, 0.0)
+    co_min = positions.min(axis=0)
+    co_max = positions.max(axis=0)
+    return tuple((co_min + co_max) * 0.5), tuple(co_max - co_min)
+
+
+# unit axes of a k-DOP, every axis contributes two planes
+def get_kdop_directions(k):
+    directions = [(1, 0, 0), (0, 1, 0), (0, 0, 1)]
+    if k == 10:
+        directions += [(1, 1, 0), (1, -1, 0)]
+    elif k >= 18:
+        directions += [(1, 1, 0), (1, -1, 0), (1, 0, 1), (1, 0, -1), (0, 1, 1), (0, 1, -1)]
+        if k >= 26:
+            directions += [(1, 1, 1), (1, 1, -1), (1, -1, 1), (-1, 1, 1)]
+    directions = np.array(directions, dtype=np.float64)
+    return directions / np.linalg.norm(directions, axis=1)[:, np.newaxis]
+
+
+# build a closed convex mesh from the intersection of half-spaces (normal . x <= offset)
+def make_convex_mesh_from_planes(normals, offsets, eps):
+    # corners are where three planes meet and no other plane cuts them off
+    triples = np.array(list(combinations(range(len(normals)), 3)))
+    systems = normals[triples]
+    solvable = np.abs(np.linalg.det(systems)) > 1e-9
+    triples = triples[solvable]
+    systems = systems[solvable]
+    points = np.linalg.solve(systems, offsets[triples][..., np.newaxis])[..., 0]
+    points = points[np.all(points @ normals.T <= offsets + eps, axis=1)]
+
+    # merge corners where more than three planes meet
+    verts = []
+    for point in points:
+        if not any(np.linalg.norm(point - vert) <= eps for vert in verts):
+            verts.append(point)
+    verts = np.array(verts)
+
+    # one face per plane touching at least three corners, wound counter-clockwise around the normal
+    faces = []
+    on_plane = np.abs(verts @ normals.T - offsets) <= eps
+    for plane_idx, normal in enumerate(normals):
+        face_verts = np.flatnonzero(on_plane[:, plane_idx])
+        if len(face_verts) < 3:
+            continue
+        rel = verts[face_verts] - verts[face_verts].mean(axis=0)
+        u = rel[0] / np.linalg.norm(rel[0])
+        v = np.cross(normal, u)
+        angles = np.arctan2(rel @ v, rel @ u)
+        faces.append(face_verts[np.argsort(angles)].tolist())
+
+    return verts, faces
+
+
+# returns verts and faces of the k-DOP enclosing an (n, 3) position array
+def fit_kdop(positions, directions):
+    if len(positions) == 0:
+        positions = np.zeros((1, 3))
+    projections = positions @ directions.T
+    d_min = projections.min(axis=0)
+    d_max = projections.max(axis=0)
+    
+    eps = max(float(np.ptp(positions, axis=0).max()), 1e-6) * 1e-5
+    # keep flat meshes from collapsing the k-DOP
+    d_max = np.maximum(d_max, d_min + eps * 10)
+    
+    normals = np.concatenate((directions, -directions))
+    offsets = np.concatenate((d_max, -d_min))
+    return make_convex_mesh_from_planes(normals, offsets, eps)
+
+
+# returns verts and faces of a convex hull within the vertex and face budget that encloses all positions,
+# face normals of the original hull are clustered by angle, every cluster becomes a single plane
+# pushed out to the farthest vertex, so the result never cuts into the original geometry
+def simplify_hull(positions, face_normals, face_areas, max_verts, max_faces):
+    eps = max(float(np.ptp(positions, axis=0).max()), 1e-6) * 1e-5
+    
+    # axis planes keep the intersection bounded, they are dropped if they don't touch the hull
+    axes = np.concatenate((np.eye(3), -np.eye(3)))
+    
+    order = np.argsort(-face_areas)
+    face_normals = face_normals[order]
+    face_areas = face_areas[order]
+    
+    angles = (2, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 60, 75, 90)
+    
+    result = None
+    for angle in angles:
+        cos_angle = np.cos(np.radians(angle))
+        
+        # greedy clustering, largest faces first
+        cluster_normals = []
+        remaining = np.ones(len(face_normals), dtype=bool)
+        while remaining.any():
+            face_idx = np.argmax(remaining)
+            members = remaining & (face_normals @ face_normals[face_idx] >= cos_angle)
+            normal = (face_normals[members] * face_areas[members, np.newaxis]).sum(axis=0)
+            length = np.linalg.norm(normal)
+            cluster_normals.append(normal / length if length > 0 else face_normals[face_idx])
+            remaining &= ~members
+        
+        # too many planes to ever get within the face budget
+        if len(cluster_normals) > max_faces * 2 and angle != angles[-1]:
+            continue
+        
+        normals = np.concatenate((np.array(cluster_normals).reshape(-1, 3), axes))
+        offsets = (positions @ normals.T).max(axis=0)
+        result = make_convex_mesh_from_planes(normals, offsets, eps)
+        
+        verts, faces = result
+        if len(verts) <= max_verts and len(faces) <= max_faces:
+            break
+    
+    return result
+
+
+# simplifies the hull of a mesh object in place if it's over budget,
+# returns (vert_count, face_count) before and after or None if nothing was done
+def simplify_collision_object(obj, max_verts, max_faces):
+    mesh = obj.data
+    vert_count = len(mesh.vertices)
+    face_count = len(mesh.polygons)
+    if (vert_count <= max_verts and face_count <= max_faces) or face_count == 0:
+        return None
+    
+    positions = get_vert_positions(mesh).astype(np.float64)
+    face_normals = np.empty(face_count * 3, dtype=np.float32)
+    mesh.polygons.foreach_get("normal", face_normals)
+    face_areas = np.empty(face_count, dtype=np.float32)
+    mesh.polygons.foreach_get("area", face_areas)
+    
+    verts, faces = simplify_hull(positions, face_normals.reshape(-1, 3).astype(np.float64), face_areas, max_verts, max_faces)
+    
+    mesh.clear_geometry()
+    mesh.from_pydata(verts.tolist(), [], faces)
+    mesh.update()
+    
+    return (vert_count, face_count), (len(verts), len(faces))
 
 
 class Op_GYAZ_Export_AddCollision (Operator):
 
     bl_idname = "object.gyaz_export_add_collision"  
     bl_label = "GYAZ Export: Add Collision"
-    bl_description = "Add a collider shape to the object."
+    bl_description = "Add a collider shape to every selected mesh object."
     bl_options = {"UNDO"}
 
     shape: EnumProperty(
         name="Shape",
         items=(
             ("BOX", "Box", ""),
-            ("SPHERE", "Sphere", "")
+            ("SPHERE", "Sphere", ""),
+            ("KDOP", "k-DOP", "Convex collider bounded by a fixed set of planes")
         ),
         default="BOX"
     )
 
     def execute (self, context):
-        obj = context.object
         scene = context.scene
 
         selected_verts_only = scene.gyaz_export.collision_use_selection
-        
-        collision = None
+
+        objs = [obj for obj in context.selected_objects if obj.type == "MESH" and not is_collision_obj(obj)]
+        if len(objs) == 0:
+            objs = [obj for obj in [context.object] if obj is not None and obj.type == "MESH" and not is_collision_obj(obj)]
+        if len(objs) == 0:
+            report (self, 'Select a mesh that is not a collision object.', 'WARNING')
+            return {'CANCELLED'}
+
+        # read geometry of every object up front, fitting runs without touching bpy
+        positions_per_obj = [self.get_positions_from_obj(obj, selected_verts_only) for obj in objs]
+
+        if self.shape == "KDOP":
+            fit = partial(fit_kdop, directions=get_kdop_directions(int(scene.gyaz_export.collision_kdop_planes)))
+        else:
+            fit = fit_bbox
+
+        with ThreadPoolExecutor() as executor:
+            fits = list(executor.map(fit, positions_per_obj))
 
         if self.shape == "BOX":
-            collision = self.generate_box_collision_from_obj_bbox(obj, scene, selected_verts_only)
+            collisions = self.generate_box_collisions(objs, fits, scene)
 
         elif self.shape == "SPHERE":
-            collision = self.generate_sphere_collision_from_obj_bbox(obj, scene, selected_verts_only)
+            collisions = self.generate_sphere_collisions(objs, fits, scene)
 
-        self.select_collision_obj(collision)
+        elif self.shape == "KDOP":
+            collisions = self.generate_kdop_collisions(objs, fits, scene)
 
-        return {'FINISHED'}
+        self.select_collision_objs(collisions)
 
-
-    def generate_box_collision_from_obj_bbox(self, obj, scene, selected_verts_only):
-        obj_name = obj.name
-        
-        bbox, dimensions = self.get_bbox_and_dimensions_from_obj(obj, selected_verts_only)
-        
-        return self.generate_box_collision(
-            bbox, dimensions, scene, obj,
-            collision_name="UBX_" + obj_name, 
-            collection_name=obj_name + "_Collision"
-        )
-        
-    
-    def generate_sphere_collision_from_obj_bbox(self, obj, scene, selected_verts_only):
-        obj_name = obj.name
-        
-        bbox, dimensions = self.get_bbox_and_dimensions_from_obj(obj, selected_verts_only)
-        
-        return self.generate_sphere_collision(
-            bbox, dimensions, scene, obj,
-            collision_name="USP_" + obj_name, 
-            collection_name=obj_name + "_Collision"
-        )
+        return {'FINISHED'}
     
     
-    def generate_box_collision(self, bbox, dimensions, scene, obj, collision_name, collection_name):    
+    def generate_box_collisions(self, objs, fits, scene):
         box_mesh = bpy.data.meshes.new(name="BoxCollision")
               
         bm = bmesh.new()
@@ -100,18 +248,12 @@ class Op_GYAZ_Export_AddCollision (Operator):
         bm.to_mesh(box_mesh)
         bm.free()
         
-        box_obj = bpy.data.objects.new(name=collision_name, object_data=box_mesh)
-        
-        bbox_center = self.vector_mean(bbox)
-        box_obj.matrix_world = obj.matrix_world @ Matrix.LocRotScale(bbox_center, None, dimensions)
+        scales = [dimensions for center, dimensions in fits]
         
-        self.link_collision_obj_to_scene(scene, box_obj, obj, collection_name)
-        self.set_collision_obj_display(box_obj)
-
-        return box_obj
+        return self.generate_collisions(box_mesh, "UBX_", objs, fits, scales, scene)
         
         
-    def generate_sphere_collision(self, bbox, dimensions, scene, obj, collision_name, collection_name):    
+    def generate_sphere_collisions(self, objs, fits, scene):
         sphere_mesh = bpy.data.meshes.new(name="SphereCollision")
               
         bm = bmesh.new()
@@ -123,33 +265,60 @@ class Op_GYAZ_Export_AddCollision (Operator):
         bm.to_mesh(sphere_mesh)
         bm.free()
         
-        sphere_obj = bpy.data.objects.new(name=collision_name, object_data=sphere_mesh)
+        scales = []
+        for center, dimensions in fits:
+            longest_dim = max(dimensions)
+            scales.append((longest_dim, longest_dim, longest_dim))
         
-        bbox_center = self.vector_mean(bbox)
-        longest_dim = max([d for d in dimensions])
-        sphere_obj.matrix_world = obj.matrix_world @ Matrix.LocRotScale(bbox_center, None, Vector((longest_dim, longest_dim, longest_dim)))
+        return self.generate_collisions(sphere_mesh, "USP_", objs, fits, scales, scene)
+    
+    
+    def generate_collisions(self, template_mesh, prefix, objs, fits, scales, scene):
+        # the template mesh is built once, every collision object gets its own copy of it
+        collisions = []
+        for obj, (center, dimensions), scale in zip(objs, fits, scales):
+            matrix = obj.matrix_world @ Matrix.LocRotScale(Vector(center), None, Vector(scale))
+            collisions.append(self.add_collision_obj(prefix + obj.name, template_mesh.copy(), matrix, obj, scene))
         
-        self.link_collision_obj_to_scene(scene, sphere_obj, obj, collection_name)
-        self.set_collision_obj_display(sphere_obj)
-
-        return sphere_obj
+        bpy.data.meshes.remove(template_mesh)
+        
+        return collisions
     
     
-    def get_bbox_and_dimensions_from_obj(self, obj, selected_verts_only):
-        bm = bmesh.new()
-        bm.from_object(obj, bpy.context.evaluated_depsgraph_get(), cage=False, face_normals=False, vertex_normals=False)
+    def generate_kdop_collisions(self, objs, fits, scene):
+        collisions = []
+        for obj, (verts, faces) in zip(objs, fits):
+            kdop_mesh = bpy.data.meshes.new(name="KDOPCollision")
+            kdop_mesh.from_pydata(verts.tolist(), [], faces)
+            kdop_mesh.update()
+            collisions.append(self.add_collision_obj("UCX_" + obj.name, kdop_mesh, obj.matrix_world, obj, scene))
+        
+        return collisions
+    
+    
+    def add_collision_obj(self, name, mesh, matrix, obj, scene):
+        coll_obj = bpy.data.objects.new(name=name, object_data=mesh)
+        coll_obj.matrix_world = matrix
+        
+        self.link_collision_obj_to_scene(scene, coll_obj, obj, obj.name + "_Collision")
+        self.set_collision_obj_display(coll_obj)
+        
+        return coll_obj
+    
+    
+    def get_positions_from_obj(self, obj, selected_verts_only):
+        obj_eval = obj.evaluated_get(bpy.context.evaluated_depsgraph_get())
+        mesh = obj_eval.to_mesh()
+        
+        positions = get_vert_positions(mesh)
         
         if selected_verts_only:
-            positions = [vert.co for vert in bm.verts if vert.select]
-            if len(positions) < 3:
-                positions = [vert.co for vert in bm.verts]
-        else:
-            positions = [vert.co for vert in bm.verts]
-
-        bbox, dimensions = get_bbox_and_dimensions(positions)
-
-        bm.free()
-        return bbox, dimensions
+            mask = get_selected_vert_mask(mesh)
+            if np.count_nonzero(mask) >= 3:
+                positions = positions[mask]
+        
+        obj_eval.to_mesh_clear()
+        return positions
         
     
     def link_collision_obj_to_scene(self, scene, coll_obj, main_obj, coll_collection_name):
@@ -168,25 +337,19 @@ class Op_GYAZ_Export_AddCollision (Operator):
         coll_collection.objects.link(coll_obj)
         
         
-    def vector_mean(self, vectors):
-        if len(vectors) == 0: 
-            return Vector()
-        sum = Vector()
-        for vec in vectors:
-            sum += vec
-        return sum / len(vectors)
-
-
     def set_collision_obj_display(self, obj):
         obj.show_in_front = True
 
 
-    def select_collision_obj(self, obj):
-        try:
-            make_active_only(obj)
-        except:
-            # object is in a hidden collection
-            pass
+    def select_collision_objs(self, objs):
+        bpy.ops.object.select_all(action='DESELECT')
+        for obj in objs:
+            try:
+                obj.select_set(True)
+                make_active(obj)
+            except:
+                # object is in a hidden collection
+                pass
 
 
     #when the buttons should show up    
@@ -196,6 +359,46 @@ class Op_GYAZ_Export_AddCollision (Operator):
         return ao and ao.type == "MESH" and context.mode == 'OBJECT'
 
 
+class Op_GYAZ_Export_SimplifyCollision (Operator):
+
+    bl_idname = "object.gyaz_export_simplify_collision"  
+    bl_label = "GYAZ Export: Simplify Collision"
+    bl_description = "Simplify selected convex collision objects to the hull vertex and face budget, keeping the original geometry enclosed."
+    bl_options = {"UNDO"}
+
+    def execute (self, context):
+        scene = context.scene
+        max_verts = scene.gyaz_export.collision_hull_max_verts
+        max_faces = scene.gyaz_export.collision_hull_max_faces
+        
+        # only convex collision objects, the geometry of anything else is kept
+        hulls = [obj for obj in bpy.context.selected_objects if obj.type == "MESH" and is_collision_obj(obj) and obj.name.startswith('UCX_')]
+        if len(hulls) == 0:
+            report (self, 'No convex collision objects (UCX_) selected.', 'WARNING')
+            return {'CANCELLED'}
+        
+        over_budget = []
+        for obj in hulls:
+            counts = simplify_collision_object(obj, max_verts, max_faces)
+            if counts is not None:
+                (verts_before, faces_before), (verts_after, faces_after) = counts
+                report (self, '{0}: {1} verts, {2} faces --> {3} verts, {4} faces'.format(
+                    obj.name, verts_before, faces_before, verts_after, faces_after), 'INFO')
+                if verts_after > max_verts or faces_after > max_faces:
+                    over_budget.append(obj.name)
+        
+        if len(over_budget) > 0:
+            report (self, "Couldn't simplify {0} to {1} verts and {2} faces.".format(', '.join(over_budget), max_verts, max_faces), 'WARNING')
+
+        return {'FINISHED'}
+
+    #when the buttons should show up    
+    @classmethod
+    def poll(cls, context):
+        obj = context.object
+        return obj and obj.type == "MESH" and context.mode == 'OBJECT'
+
+
 class Op_GYAZ_Export_BakeCollision (Operator):
 
     bl_idname = "object.gyaz_export_bake_collision"  
@@ -220,9 +423,11 @@ class Op_GYAZ_Export_BakeCollision (Operator):
 
 def register():
     bpy.utils.register_class (Op_GYAZ_Export_AddCollision)
+    bpy.utils.register_class (Op_GYAZ_Export_SimplifyCollision)
     bpy.utils.register_class (Op_GYAZ_Export_BakeCollision)
 
 
 def unregister():
     bpy.utils.unregister_class (Op_GYAZ_Export_AddCollision)
+    bpy.utils.unregister_class (Op_GYAZ_Export_SimplifyCollision)
     bpy.utils.unregister_class (Op_GYAZ_Export_BakeCollision)
@@ -0,0 +1,717 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any laTter version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+##########################################################################################################
+##########################################################################################################
+
+# Quadric error metric mesh simplifier working on plain NumPy arrays.
+# Doesn't import bpy, so it can run in a separate process or outside of Blender.
+#
+# Mesh arrays are a dict:
+#   positions   (n, 3) float    vertex positions
+#   triangles   (m, 3) int      vertex indices
+#   uvs         (l, m, 3, 2)    uv of every triangle corner, for every uv map
+#   materials   (m,) int        material index
+#   smooth      (m,) bool       smooth shading
+#   seam_edges  (k, 2) int      uv seams marked in the mesh
+#   sharp_edges (k, 2) int      edges marked sharp
+#
+# Decimated mesh arrays also have:
+#   vertex_indices (n,) int     source vertex of every vertex, to carry over per vertex data like weights
+#
+# UV discontinuities, material borders, smooth/flat borders, sharp edges and open borders are attribute seams,
+# vertices on them only move along the seam and vertices where seams meet are locked.
+
+import numpy as np
+
+
+FREE = 0
+SEAM = 1
+LOCKED = 2
+
+# weight of the planes that hold seams and borders in place
+SEAM_WEIGHT = 100.0
+
+UV_EPSILON = 1e-5
+
+# rounds of picking independent collapses in a pass
+SELECTION_ROUNDS = 8
+
+
+def encode_edges(edges, vert_count):
+    edges = np.sort(edges.reshape(-1, 2), axis=1).astype(np.int64)
+    return edges[:, 0] * vert_count + edges[:, 1]
+
+
+# np.cross, np.linalg.norm and np.linalg.det are slow for many short vectors
+def _dot(a, b):
+    return np.einsum('ij,ij->i', a, b)
+
+
+def _cross(a, b):
+    return np.stack((a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1],
+                     a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2],
+                     a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]), axis=1)
+
+
+def _unique(keys):
+    # sorted unique integers, np.unique hashes them and is many times slower on large arrays
+    keys = np.sort(keys)
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    return keys[first]
+
+
+def _plane_quadrics(normals, points, weights):
+    # outer product of the plane (a, b, c, d), scaled by weight
+    planes = np.concatenate((normals, -np.einsum('ij,ij->i', normals, points)[:, np.newaxis]), axis=1)
+    return np.einsum('ij,ik->ijk', planes, planes) * weights[:, np.newaxis, np.newaxis]
+
+
+def find_attribute_seams(mesh_arrays):
+    """Returns seam edges (k, 2), the edge (k, 2) array of all edges and
+    the triangle-per-edge count (k,)."""
+    positions = mesh_arrays['positions']
+    triangles = mesh_arrays['triangles']
+    uvs = mesh_arrays['uvs']
+    materials = mesh_arrays['materials']
+    vert_count = len(positions)
+    tri_count = len(triangles)
+
+    # every triangle side as (tri, corner_a, corner_b)
+    corner_a = np.tile(np.arange(3), tri_count)
+    corner_b = (corner_a + 1) % 3
+    tri_idx = np.repeat(np.arange(tri_count), 3)
+    verts_a = triangles[tri_idx, corner_a]
+    verts_b = triangles[tri_idx, corner_b]
+    keys = encode_edges(np.stack((verts_a, verts_b), axis=1), vert_count)
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    unique_keys, first, counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+
+    seam = counts != 2
+
+    # compare attributes of the two triangles sharing an edge
+    pair = np.flatnonzero(counts == 2)
+    side_1 = order[first[pair]]
+    side_2 = order[first[pair] + 1]
+    tri_1 = tri_idx[side_1]
+    tri_2 = tri_idx[side_2]
+
+    pair_seam = materials[tri_1] != materials[tri_2]
+    if 'smooth' in mesh_arrays:
+        smooth = mesh_arrays['smooth']
+        pair_seam |= smooth[tri_1] != smooth[tri_2]
+
+    if len(uvs) > 0:
+        # match corners by vertex, the two sides run in opposite directions
+        va_1 = verts_a[side_1]
+        uv_1a = uvs[:, tri_1, corner_a[side_1]]
+        uv_1b = uvs[:, tri_1, corner_b[side_1]]
+        same_dir = verts_a[side_2] == va_1
+        corner_2a = np.where(same_dir, corner_a[side_2], corner_b[side_2])
+        corner_2b = np.where(same_dir, corner_b[side_2], corner_a[side_2])
+        uv_2a = uvs[:, tri_2, corner_2a]
+        uv_2b = uvs[:, tri_2, corner_2b]
+        diff = np.maximum(np.abs(uv_1a - uv_2a).max(axis=(0, 2)), np.abs(uv_1b - uv_2b).max(axis=(0, 2)))
+        pair_seam |= diff > UV_EPSILON
+
+    seam[pair] = pair_seam
+
+    edges = np.stack((unique_keys // vert_count, unique_keys % vert_count), axis=1)
+
+    # marked seams and sharp edges
+    for name in ('seam_edges', 'sharp_edges'):
+        marked = mesh_arrays.get(name)
+        if marked is not None and len(marked) > 0:
+            seam |= np.isin(unique_keys, encode_edges(marked, vert_count))
+
+    return edges[seam], edges, counts
+
+
+class _Simplifier:
+    """Collapses edges in passes. Every pass plans a collapse for every edge, takes the cheapest ones whose
+    neighbourhoods don't overlap, checks them and collapses them all at once."""
+
+    def __init__(self, mesh_arrays):
+        self.positions = np.array(mesh_arrays['positions'], dtype=np.float64)
+        self.triangles = np.array(mesh_arrays['triangles'], dtype=np.int64).reshape(-1, 3)
+        self.uvs = np.array(mesh_arrays['uvs'], dtype=np.float64).reshape(-1, len(self.triangles), 3, 2)
+        self.materials = np.asarray(mesh_arrays['materials'])
+        self.smooth = np.asarray(mesh_arrays.get('smooth', np.ones(len(self.triangles), dtype=bool)))
+        self.tri_alive = np.ones(len(self.triangles), dtype=bool)
+        self.alive_count = len(self.triangles)
+        self.vert_count = vert_count = len(self.positions)
+
+        # edges are encoded keys, marked edges are carried through collapses
+        self.marked_keys = {}
+        for name in ('seam_edges', 'sharp_edges'):
+            marked = np.asarray(mesh_arrays.get(name, np.zeros((0, 2))), dtype=np.int64)
+            self.marked_keys[name] = _unique(encode_edges(marked, vert_count))
+
+        seam_edges, edges, edge_tri_counts = find_attribute_seams(mesh_arrays)
+        self.seam_keys = _unique(encode_edges(seam_edges, vert_count))
+
+        # vertex kinds, where seams branch or end, vertices are locked
+        seam_degree = np.bincount(seam_edges.ravel(), minlength=vert_count)
+        self.kinds = np.where(seam_degree == 0, FREE, np.where(seam_degree == 2, SEAM, LOCKED))
+        nonmanifold = edges[edge_tri_counts > 2].ravel()
+        self.kinds[nonmanifold] = LOCKED
+
+        self.quadrics = self._make_quadrics(seam_edges)
+
+        # edges that failed the checks, skipped until a collapse changes the triangles around them
+        self.invalid_keys = np.zeros(0, dtype=np.int64)
+        # grows when none of the cheapest collapses of a pass is valid
+        self.candidate_scale = 1
+
+    def _make_quadrics(self, seam_edges):
+        positions = self.positions
+        tris = self.triangles
+        v0 = positions[tris[:, 0]]
+        v1 = positions[tris[:, 1]]
+        v2 = positions[tris[:, 2]]
+        cross = np.cross(v1 - v0, v2 - v0)
+        double_area = np.linalg.norm(cross, axis=1)
+        normals = cross / np.maximum(double_area, 1e-30)[:, np.newaxis]
+
+        face_quadrics = _plane_quadrics(normals, v0, double_area * 0.5)
+        quadrics = np.zeros((len(positions), 4, 4))
+        for corner in range(3):
+            np.add.at(quadrics, tris[:, corner], face_quadrics)
+
+        # planes through seam edges, perpendicular to the neighbouring faces
+        if len(seam_edges) > 0:
+            vert_count = len(positions)
+            seam_keys = encode_edges(seam_edges, vert_count)
+            sides = np.concatenate((tris[:, [0, 1]], tris[:, [1, 2]], tris[:, [2, 0]]))
+            side_tris = np.tile(np.arange(len(tris)), 3)
+            on_seam = np.isin(encode_edges(sides, vert_count), seam_keys)
+            sides = sides[on_seam]
+            side_tris = side_tris[on_seam]
+            a = positions[sides[:, 0]]
+            edge_vec = positions[sides[:, 1]] - a
+            seam_normals = np.cross(edge_vec, normals[side_tris])
+            length = np.linalg.norm(seam_normals, axis=1)
+            valid = length > 1e-30
+            seam_normals = seam_normals[valid] / length[valid][:, np.newaxis]
+            weights = np.einsum('ij,ij->i', edge_vec[valid], edge_vec[valid]) * SEAM_WEIGHT
+            seam_quadrics = _plane_quadrics(seam_normals, a[valid], weights)
+            np.add.at(quadrics, sides[valid, 0], seam_quadrics)
+            np.add.at(quadrics, sides[valid, 1], seam_quadrics)
+
+        return quadrics
+
+    def _alive_edges(self):
+        """Returns the (e, 2) edges of the alive triangles and their keys."""
+        keys = _unique(encode_edges(self.triangles[self.tri_alive][:, [0, 1, 1, 2, 2, 0]], self.vert_count))
+        return np.stack((keys // self.vert_count, keys % self.vert_count), axis=1), keys
+
+    def _plan_collapses(self, edges, keys):
+        """Returns (cost, keep, remove, position) arrays for an (e, 2) edge array, the cost is inf where the edge can't collapse."""
+        a = edges[:, 0]
+        b = edges[:, 1]
+        kind_a = self.kinds[a]
+        kind_b = self.kinds[b]
+        quadrics = self.quadrics[a] + self.quadrics[b]
+        pos_a = self.positions[a]
+        pos_b = self.positions[b]
+
+        def errors(positions):
+            return _dot(np.einsum('eij,ej->ei', quadrics[:, :3, :3], positions) + 2.0 * quadrics[:, :3, 3], positions) + quadrics[:, 3, 3]
+
+        # free vertices move to the best of the two ends, the middle and the optimal position,
+        # the optimal position solves the symmetric 3x3 system with the cofactors of its rows
+        middle = (pos_a + pos_b) * 0.5
+        optimal = middle.copy()
+        rows = quadrics[:, :3, :3]
+        cofactors = (_cross(rows[:, 1], rows[:, 2]), _cross(rows[:, 2], rows[:, 0]), _cross(rows[:, 0], rows[:, 1]))
+        determinants = _dot(rows[:, 0], cofactors[0])
+        solvable = np.abs(determinants) > 1e-12
+        if solvable.any():
+            rhs = -quadrics[solvable, :3, 3]
+            optimal[solvable] = (cofactors[0][solvable] * rhs[:, 0:1] + cofactors[1][solvable] * rhs[:, 1:2] 
+                                 + cofactors[2][solvable] * rhs[:, 2:3]) / determinants[solvable][:, np.newaxis]
+        candidates = np.stack((pos_a, pos_b, middle, optimal))
+        candidate_errors = np.stack([errors(candidate) for candidate in candidates])
+        candidate_errors[~np.isfinite(candidate_errors)] = np.inf
+        best = np.argmin(candidate_errors, axis=0)
+        edge_indices = np.arange(len(edges))
+        costs = candidate_errors[best, edge_indices]
+        positions = candidates[best, edge_indices]
+        keep = a.copy()
+        remove = b.copy()
+
+        # seam vertices only slide along their own seam, the more constrained vertex stays in place
+        error_a = candidate_errors[0]
+        error_b = candidate_errors[1]
+        constrained = (kind_a != FREE) | (kind_b != FREE)
+        keep_b = constrained & np.where(kind_a == kind_b, error_b < error_a, kind_b > kind_a)
+        keep[keep_b] = b[keep_b]
+        remove[keep_b] = a[keep_b]
+        costs[constrained] = np.where(keep_b, error_b, error_a)[constrained]
+        positions[constrained] = self.positions[keep[constrained]]
+
+        on_seam = np.isin(keys, self.seam_keys)
+        invalid = (kind_a == LOCKED) & (kind_b == LOCKED)
+        invalid |= (kind_a == SEAM) & (kind_b == SEAM) & ~on_seam
+        invalid |= (np.maximum(kind_a, kind_b) == LOCKED) & (np.minimum(kind_a, kind_b) == SEAM) & ~on_seam
+        costs[invalid] = np.inf
+
+        return costs, keep, remove, positions
+
+    def _select_independent(self, edges, cheapest):
+        """Returns the cheapest edges (indices sorted by cost) of which no two have a vertex in the same triangle, 
+        so they can be checked and collapsed at once. Every round takes the edges that are the cheapest 
+        around both of their ends and drops the edges around them."""
+        tris = self.triangles[self.tri_alive]
+        remaining = np.arange(len(cheapest))
+        selected = []
+        for _ in range(SELECTION_ROUNDS):
+            unranked = len(cheapest)
+            remaining_edges = edges[cheapest[remaining]]
+            vert_ranks = np.full(self.vert_count, unranked)
+            np.minimum.at(vert_ranks, remaining_edges.ravel(), np.repeat(remaining, 2))
+            corner_ranks = vert_ranks[tris]
+            tri_ranks = np.minimum(np.minimum(corner_ranks[:, 0], corner_ranks[:, 1]), corner_ranks[:, 2])
+            ring_ranks = np.full(self.vert_count, unranked)
+            np.minimum.at(ring_ranks, tris.ravel(), np.repeat(tri_ranks, 3))
+            chosen = (ring_ranks[remaining_edges[:, 0]] == remaining) & (ring_ranks[remaining_edges[:, 1]] == remaining)
+            selected.append(remaining[chosen])
+
+            # the vertices of the triangles around the chosen edges are taken
+            taken = np.zeros(self.vert_count, dtype=bool)
+            taken[remaining_edges[chosen].ravel()] = True
+            corners_taken = taken[tris]
+            taken[tris[corners_taken[:, 0] | corners_taken[:, 1] | corners_taken[:, 2]].ravel()] = True
+            remaining = remaining[~(taken[remaining_edges[:, 0]] | taken[remaining_edges[:, 1]])]
+            if len(remaining) == 0:
+                break
+        return cheapest[np.sort(np.concatenate(selected))]
+
+    def _collapse_batch(self, keep, remove, positions, max_removed_count):
+        """Checks independent collapses and applies the valid ones in order until max_removed_count triangles are removed.
+        Returns the number of applied collapses and a mask of the invalid ones."""
+        vert_count = self.vert_count
+        collapse_count = len(keep)
+        collapse_indices = np.arange(collapse_count)
+
+        # the triangles around every collapse, a triangle is around one collapse at most
+        collapse_of_vert = np.full(vert_count, -1)
+        collapse_of_vert[keep] = collapse_indices
+        collapse_of_vert[remove] = collapse_indices
+        alive = np.flatnonzero(self.tri_alive)
+        corner_collapses = collapse_of_vert[self.triangles[alive]]
+        tri_collapses = np.maximum(np.maximum(corner_collapses[:, 0], corner_collapses[:, 1]), corner_collapses[:, 2])
+        around = tri_collapses >= 0
+        tri_indices = alive[around]
+        tris = self.triangles[tri_indices]
+        collapses = tri_collapses[around]
+        is_keep = tris == keep[collapses][:, np.newaxis]
+        is_remove = tris == remove[collapses][:, np.newaxis]
+        moved = is_keep | is_remove
+        shared = moved[:, 0] & moved[:, 1] | moved[:, 1] & moved[:, 2] | moved[:, 2] & moved[:, 0]
+        shared_counts = np.bincount(collapses[shared], minlength=collapse_count)
+
+        # link condition, the two vertices only have the neighbours of their shared triangles in common, keeps the mesh manifold
+        verts = tris[:, [0, 0, 1, 1, 2, 2]].ravel()
+        neighbours = tris[:, [1, 2, 0, 2, 0, 1]].ravel()
+        pair_collapses = np.repeat(collapses, 6)
+        on_keep = verts == keep[pair_collapses]
+        on_remove = verts == remove[pair_collapses]
+        keep_neighbours = _unique(pair_collapses[on_keep] * vert_count + neighbours[on_keep])
+        remove_neighbours = _unique(pair_collapses[on_remove] * vert_count + neighbours[on_remove])
+        common = np.intersect1d(keep_neighbours, remove_neighbours, assume_unique=True)
+        common_counts = np.bincount(common // vert_count, minlength=collapse_count)
+
+        # don't flip or collapse any face around the moved vertices
+        changed = ~shared
+        before = self.positions[tris[changed]]
+        after = before.copy()
+        after[moved[changed]] = positions[collapses[changed]]
+        normals_before = np.cross(before[:, 1] - before[:, 0], before[:, 2] - before[:, 0])
+        normals_after = np.cross(after[:, 1] - after[:, 0], after[:, 2] - after[:, 0])
+        dots = np.einsum('ij,ij->i', normals_before, normals_after)
+        lengths = np.linalg.norm(normals_before, axis=1) * np.linalg.norm(normals_after, axis=1)
+        flipped_counts = np.bincount(collapses[changed][dots <= 0.2 * lengths], minlength=collapse_count)
+
+        valid = (shared_counts > 0) & (common_counts == shared_counts) & (flipped_counts == 0)
+
+        # cheapest first, stop once enough triangles are removed
+        valid_indices = np.flatnonzero(valid)
+        removed_counts = shared_counts[valid_indices]
+        applied = valid_indices[np.cumsum(removed_counts) - removed_counts < max_removed_count]
+        is_applied = np.zeros(collapse_count, dtype=bool)
+        is_applied[applied] = True
+        tri_applied = is_applied[collapses]
+
+        self._remap_uvs(tri_indices[tri_applied], collapses[tri_applied], is_keep[tri_applied], is_remove[tri_applied],
+                        shared[tri_applied], keep, remove, positions)
+
+        self.tri_alive[tri_indices[shared & tri_applied]] = False
+        self.alive_count -= int(shared_counts[applied].sum())
+        remap = np.arange(vert_count)
+        remap[remove[applied]] = keep[applied]
+        self.triangles[tri_indices[tri_applied]] = remap[tris[tri_applied]]
+        self.positions[keep[applied]] = positions[applied]
+        self.quadrics[keep[applied]] += self.quadrics[remove[applied]]
+
+        self.seam_keys = self._remap_keys(self.seam_keys, remap)
+        for name, keys in self.marked_keys.items():
+            self.marked_keys[name] = self._remap_keys(keys, remap)
+
+        # changed triangles may make invalid edges around them valid
+        if len(self.invalid_keys) > 0:
+            dirty = np.zeros(vert_count, dtype=bool)
+            dirty[tris[tri_applied].ravel()] = True
+            self.invalid_keys = self.invalid_keys[~(dirty[self.invalid_keys // vert_count] | dirty[self.invalid_keys % vert_count])]
+
+        return len(applied), ~valid
+
+    def _remap_keys(self, keys, remap):
+        if len(keys) == 0:
+            return keys
+        edges = remap[np.stack((keys // self.vert_count, keys % self.vert_count), axis=1)]
+        return _unique(encode_edges(edges[edges[:, 0] != edges[:, 1]], self.vert_count))
+
+    def _remap_uvs(self, tri_indices, collapses, is_keep, is_remove, shared, keep, remove, positions):
+        # triangles around the applied collapses, before they are collapsed
+        if len(self.uvs) == 0 or len(tri_indices) == 0:
+            return
+        uvs = self.uvs
+
+        # the first and the last shared triangle of every collapse, the same one if there's one
+        shared_rows = np.flatnonzero(shared)
+        shared_rows = shared_rows[np.argsort(collapses[shared_rows], kind='stable')]
+        shared_collapses, first = np.unique(collapses[shared_rows], return_index=True)
+        last = np.append(first[1:], len(shared_rows)) - 1
+        first_rows = np.zeros(len(keep), dtype=np.int64)
+        last_rows = np.zeros(len(keep), dtype=np.int64)
+        first_rows[shared_collapses] = shared_rows[first]
+        last_rows[shared_collapses] = shared_rows[last]
+
+        def corner_uvs(rows, corner_mask):
+            return uvs[:, tri_indices[rows], np.argmax(corner_mask[rows], axis=1)]
+
+        uv_keep_first = corner_uvs(first_rows, is_keep)
+        uv_remove_first = corner_uvs(first_rows, is_remove)
+        uv_keep_last = corner_uvs(last_rows, is_keep)
+        uv_remove_last = corner_uvs(last_rows, is_remove)
+        free = (self.kinds[keep] == FREE) & (self.kinds[remove] == FREE)
+
+        # one continuous uv patch, interpolate along the collapsed edge
+        rows, corners = np.nonzero(is_keep | is_remove)
+        row_collapses = collapses[rows]
+        on_free = free[row_collapses]
+        rows, corners, row_collapses = rows[on_free], corners[on_free], row_collapses[on_free]
+        edge = self.positions[remove[row_collapses]] - self.positions[keep[row_collapses]]
+        lengths = np.einsum('ij,ij->i', edge, edge)
+        offsets = np.einsum('ij,ij->i', positions[row_collapses] - self.positions[keep[row_collapses]], edge)
+        t = np.where(lengths > 0, np.clip(offsets / np.maximum(lengths, 1e-300), 0, 1), 0.0)
+        uv_keep = uv_keep_first[:, row_collapses]
+        uvs[:, tri_indices[rows], corners] = uv_keep + (uv_remove_first[:, row_collapses] - uv_keep) * t[:, np.newaxis]
+
+        # the removed vertex takes the uv the kept vertex has on the same side of the seam
+        rows, corners = np.nonzero(is_remove & ~shared[:, np.newaxis])
+        row_collapses = collapses[rows]
+        on_seam = ~free[row_collapses]
+        rows, corners, row_collapses = rows[on_seam], corners[on_seam], row_collapses[on_seam]
+        uv = uvs[:, tri_indices[rows], corners]
+        distances_first = np.abs(uv - uv_remove_first[:, row_collapses]).max(axis=(0, 2))
+        distances_last = np.abs(uv - uv_remove_last[:, row_collapses]).max(axis=(0, 2))
+        uvs[:, tri_indices[rows], corners] = np.where((distances_last < distances_first)[:, np.newaxis], 
+                                                      uv_keep_last[:, row_collapses], uv_keep_first[:, row_collapses])
+
+    def run(self, target_tri_count):
+        while self.alive_count > target_tri_count:
+            edges, keys = self._alive_edges()
+            costs, keep, remove, positions = self._plan_collapses(edges, keys)
+            costs[np.isin(keys, self.invalid_keys)] = np.inf
+            candidates = np.flatnonzero(np.isfinite(costs))
+            if len(candidates) == 0:
+                break
+
+            # a collapse removes two triangles at most, about as many of the cheapest edges as needed compete
+            removed_count = self.alive_count - target_tri_count
+            candidate_count = min(len(candidates), max(1, removed_count // 2) * self.candidate_scale)
+            cheapest = candidates[np.argpartition(costs[candidates], candidate_count - 1)[:candidate_count]]
+            cheapest = cheapest[np.argsort(costs[cheapest], kind='stable')]
+
+            selected = self._select_independent(edges, cheapest)
+            applied_count, invalid = self._collapse_batch(keep[selected], remove[selected], positions[selected], removed_count)
+            self.invalid_keys = _unique(np.concatenate((self.invalid_keys, keys[selected[invalid]])))
+            if applied_count == 0:
+                self.candidate_scale *= 2
+
+    def snapshot(self):
+        return (self.positions.copy(), self.triangles.copy(), self.tri_alive.copy(), self.uvs.copy(), self.quadrics.copy(),
+                self.alive_count, self.seam_keys, dict(self.marked_keys), self.invalid_keys, self.candidate_scale)
+
+    def restore(self, snapshot):
+        positions, triangles, tri_alive, uvs, quadrics, self.alive_count, self.seam_keys, marked_keys, self.invalid_keys, \
+            self.candidate_scale = snapshot
+        self.positions = positions.copy()
+        self.triangles = triangles.copy()
+        self.tri_alive = tri_alive.copy()
+        self.uvs = uvs.copy()
+        self.quadrics = quadrics.copy()
+        self.marked_keys = dict(marked_keys)
+
+    def result(self):
+        triangles = self.triangles[self.tri_alive]
+        used = np.unique(triangles)
+        remap = np.full(len(self.positions), -1, dtype=np.int64)
+        remap[used] = np.arange(len(used))
+
+        def remap_edges(keys):
+            edges = remap[np.stack((keys // self.vert_count, keys % self.vert_count), axis=1)]
+            return edges[np.all(edges >= 0, axis=1)]
+
+        return {
+            'positions': self.positions[used],
+            'triangles': remap[triangles],
+            'uvs': self.uvs[:, self.tri_alive],
+            'materials': self.materials[self.tri_alive],
+            'smooth': self.smooth[self.tri_alive],
+            'seam_edges': remap_edges(self.marked_keys['seam_edges']),
+            'sharp_edges': remap_edges(self.marked_keys['sharp_edges']),
+            'vertex_indices': used,
+        }
+
+
+def decimate(mesh_arrays, target_tri_count):
+    """Collapses edges in order of quadric error until the mesh has
+    target_tri_count triangles or no valid collapse is left. Returns new mesh arrays."""
+    if len(mesh_arrays['triangles']) == 0:
+        # nothing to collapse
+        return dict(mesh_arrays, vertex_indices=np.arange(len(mesh_arrays['positions'])))
+    simplifier = _Simplifier(mesh_arrays)
+    simplifier.run(target_tri_count)
+    return simplifier.result()
+
+
+SAMPLE_COUNT = 4096
+
+
+def _sample_surface(corners, sample_count):
+    # area weighted random points, seeded so the same mesh always gives the same samples
+    double_areas = np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+    total = double_areas.sum()
+    if total == 0:
+        return np.zeros((0, 3))
+
+    rng = np.random.default_rng(0)
+    tri_idx = rng.choice(len(corners), size=sample_count, p=double_areas / total)
+    u, v = rng.random((2, sample_count))
+    flip = u + v > 1
+    u[flip] = 1 - u[flip]
+    v[flip] = 1 - v[flip]
+    picked = corners[tri_idx]
+    return picked[:, 0] + (picked[:, 1] - picked[:, 0]) * u[:, np.newaxis] + (picked[:, 2] - picked[:, 0]) * v[:, np.newaxis]
+
+
+def _segment_squared_distances(points, a, b):
+    ab = b - a
+    ap = points - a
+    t = np.clip(_dot(ap, ab) / np.maximum(_dot(ab, ab), 1e-30), 0, 1)
+    offsets = ap - ab * t[:, np.newaxis]
+    return _dot(offsets, offsets)
+
+
+def _point_triangle_distances(points, corners):
+    a, b, c = corners[:, 0], corners[:, 1], corners[:, 2]
+    normals = _cross(b - a, c - a)
+    squared_lengths = _dot(normals, normals)
+    # inside if the point is on the inner side of all three edges
+    inside = squared_lengths > 0
+    for start, end in ((a, b), (b, c), (c, a)):
+        inside &= _dot(_cross(end - start, points - start), normals) >= 0
+    plane_distances = _dot(points - a, normals) ** 2 / np.maximum(squared_lengths, 1e-30)
+    edge_distances = np.minimum(np.minimum(_segment_squared_distances(points, a, b), _segment_squared_distances(points, b, c)),
+                                _segment_squared_distances(points, c, a))
+    return np.sqrt(np.where(inside, plane_distances, edge_distances))
+
+
+MORTON_BITS = 21
+LEAF_SIZE = 8
+# largest number of (point, leaf) pairs whose triangle distances are computed at once
+LEAF_BATCH_SIZE = 1 << 14
+
+
+def _morton_codes(points, origin, scale):
+    # position along a z-order curve, MORTON_BITS per axis interleaved
+    cells = np.clip((points - origin) * scale, 0, (1 << MORTON_BITS) - 1).astype(np.int64)
+    codes = np.zeros(len(points), dtype=np.int64)
+    for bit in range(MORTON_BITS):
+        for axis in range(3):
+            codes |= ((cells[:, axis] >> bit) & 1) << (3 * bit + axis)
+    return codes
+
+
+def _box_distances(points, lo, hi):
+    return np.linalg.norm(np.maximum(np.maximum(lo - points, 0), points - hi), axis=1)
+
+
+class _TriangleTree:
+    """Triangles sorted along a z-order curve and grouped into leaves of LEAF_SIZE,
+    with a complete binary tree of bounding boxes above the leaves, for exact closest distance queries."""
+
+    def __init__(self, corners):
+        centers = corners.mean(axis=1)
+        self.origin = centers.min(axis=0)
+        self.scale = ((1 << MORTON_BITS) - 1) / max(float((centers.max(axis=0) - self.origin).max()), 1e-30)
+        codes = _morton_codes(centers, self.origin, self.scale)
+        order = np.argsort(codes, kind='stable')
+        self.codes = codes[order]
+
+        self.depth = max(0, int(np.ceil(np.log2(max(len(corners) / LEAF_SIZE, 1)))))
+        leaf_count = 1 << self.depth
+        # pad the last leaves with copies of the last triangle, they don't change distances
+        order = np.concatenate((order, np.full(leaf_count * LEAF_SIZE - len(order), order[-1])))
+        self.leaf_corners = corners[order].reshape(leaf_count, LEAF_SIZE, 3, 3)
+
+        # bounding boxes of every level from the root down to the leaves, and a vertex of every node
+        lo = self.leaf_corners.min(axis=(1, 2))
+        hi = self.leaf_corners.max(axis=(1, 2))
+        self.boxes = [(lo, hi)]
+        while len(lo) > 1:
+            lo = np.minimum(lo[0::2], lo[1::2])
+            hi = np.maximum(hi[0::2], hi[1::2])
+            self.boxes.append((lo, hi))
+        self.boxes.reverse()
+        self.node_verts = [self.leaf_corners[::1 << (self.depth - level), 0, 0] for level in range(self.depth + 1)]
+
+    def _leaf_distances(self, points, leaves):
+        distances = _point_triangle_distances(np.repeat(points, LEAF_SIZE, axis=0), self.leaf_corners[leaves].reshape(-1, 3, 3))
+        return distances.reshape(-1, LEAF_SIZE).min(axis=1)
+
+    def distances(self, points, chunk_size=256):
+        result = np.empty(len(points))
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start:start + chunk_size]
+            point_indices = np.arange(len(chunk))
+
+            # first bound: the leaf where the points are on the curve
+            leaves = np.minimum(np.searchsorted(self.codes, _morton_codes(chunk, self.origin, self.scale)) // LEAF_SIZE,
+                                (1 << self.depth) - 1)
+            bounds = self._leaf_distances(chunk, leaves)
+
+            # walk down the tree, keeping nodes whose boxes may be closer than the bound,
+            # a vertex of every kept node tightens the bound
+            nodes = np.zeros(len(chunk), dtype=np.int64)
+            for level in range(self.depth + 1):
+                lo, hi = self.boxes[level]
+                box_distances = _box_distances(chunk[point_indices], lo[nodes], hi[nodes])
+                keep = box_distances <= bounds[point_indices]
+                point_indices, nodes, box_distances = point_indices[keep], nodes[keep], box_distances[keep]
+                np.minimum.at(bounds, point_indices, np.linalg.norm(chunk[point_indices] - self.node_verts[level][nodes], axis=1))
+                if level < self.depth:
+                    point_indices = np.repeat(point_indices, 2)
+                    nodes = (np.repeat(nodes, 2) * 2) + np.tile([0, 1], len(nodes))
+
+            # closest leaves first, so the bound prunes the rest early
+            order = np.argsort(box_distances, kind='stable')
+            point_indices, nodes, box_distances = point_indices[order], nodes[order], box_distances[order]
+            for batch_start in range(0, len(nodes), LEAF_BATCH_SIZE):
+                batch = slice(batch_start, batch_start + LEAF_BATCH_SIZE)
+                keep = box_distances[batch] <= bounds[point_indices[batch]]
+                batch_points = point_indices[batch][keep]
+                np.minimum.at(bounds, batch_points, self._leaf_distances(chunk[batch_points], nodes[batch][keep]))
+
+            result[start:start + chunk_size] = bounds
+        return result
+
+
+def _hausdorff_distance(points_a, tree_a, mesh_arrays_b, sample_count):
+    # from the samples and the triangle tree of surface a, so they can be reused for more surfaces
+    corners_b = mesh_arrays_b['positions'][mesh_arrays_b['triangles']]
+    points_b = _sample_surface(corners_b, sample_count)
+    if len(points_a) == 0 or len(points_b) == 0:
+        return 0.0 if len(points_a) == len(points_b) else float('inf')
+    return max(float(_TriangleTree(corners_b).distances(points_a).max()), float(tree_a.distances(points_b).max()))
+
+
+def hausdorff_distance(mesh_arrays_a, mesh_arrays_b, sample_count=SAMPLE_COUNT):
+    """Approximate symmetric Hausdorff distance between two surfaces, measured from random surface samples."""
+    corners_a = mesh_arrays_a['positions'][mesh_arrays_a['triangles']]
+    points_a = _sample_surface(corners_a, sample_count)
+    tree_a = _TriangleTree(corners_a) if len(points_a) > 0 else None
+    return _hausdorff_distance(points_a, tree_a, mesh_arrays_b, sample_count)
+
+
+def decimate_to_error(mesh_arrays, max_error, min_tri_count=0):
+    """Collapses edges in doubling steps, starting at a tenth of the triangles, until a step goes over max_error
+    Hausdorff distance to mesh_arrays, then bisects between the last triangle count within it and the one over it.
+    Steps over max_error are undone. Stops when the two counts are within 2%. Returns the decimated mesh arrays."""
+    best = dict(mesh_arrays, vertex_indices=np.arange(len(mesh_arrays['positions'])))
+    if len(mesh_arrays['triangles']) == 0:
+        return best
+    corners = mesh_arrays['positions'][mesh_arrays['triangles']]
+    points = _sample_surface(corners, SAMPLE_COUNT)
+    tree = _TriangleTree(corners) if len(points) > 0 else None
+
+    simplifier = _Simplifier(mesh_arrays)
+    step = max(1, simplifier.alive_count // 10)
+    failed_tri_count = None
+    while simplifier.alive_count > min_tri_count:
+        tri_count = simplifier.alive_count
+        if failed_tri_count is None:
+            target_tri_count = max(min_tri_count, tri_count - step)
+        elif tri_count - failed_tri_count <= max(1, tri_count // 50):
+            break
+        else:
+            target_tri_count = (tri_count + failed_tri_count) // 2
+        snapshot = simplifier.snapshot()
+        simplifier.run(target_tri_count)
+        if simplifier.alive_count == tri_count:
+            # no valid collapse left
+            break
+        result = simplifier.result()
+        if _hausdorff_distance(points, tree, result, SAMPLE_COUNT) <= max_error:
+            best = result
+            step *= 2
+        else:
+            simplifier.restore(snapshot)
+            failed_tri_count = target_tri_count
+    return best
+
+
+def decimate_job(mesh_arrays, target_tri_count, max_error=None):
+    if max_error is None:
+        return decimate(mesh_arrays, target_tri_count)
+    return decimate_to_error(mesh_arrays, max_error, target_tri_count)
+
+
+def save_mesh_arrays(path, mesh_arrays):
+    np.savez(path, **mesh_arrays)
+
+
+def load_mesh_arrays(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+if __name__ == "__main__":
+    # worker process: python decimate.py <input.npz> <output.npz> <target triangle count> [max error]
+    # with a max error the target triangle count is the lower bound of the search
+    import sys
+    input_path, output_path, target_tri_count = sys.argv[1:4]
+    max_error = float(sys.argv[4]) if len(sys.argv) > 4 else None
+    save_mesh_arrays(output_path, decimate_job(load_mesh_arrays(input_path), int(target_tri_count), max_error))
@@ -20,20 +20,54 @@
 ##########################################################################################################
 ##########################################################################################################
 
-import bpy, os, bmesh
+import bpy, os, sys, bmesh, json, subprocess, tempfile, hashlib, time, zipfile
+import numpy as np
 from mathutils import Vector
 from pathlib import Path
-from bpy.props import EnumProperty
+from concurrent.futures import ThreadPoolExecutor
+from bpy.props import EnumProperty, BoolProperty, StringProperty
 from bpy.types import Operator
 from .utils import report, popup, list_to_visual_list, make_active_only, sn, get_active_action, \
     is_str_blank, detect_mirrored_uvs, clear_transformation, clear_transformation_matrix, \
     gather_images_from_material, clear_blender_collection, set_active_action, POD, remove_dot_plus_three_numbers, \
     make_lod_object_name_pattern, get_name_and_lod_index, set_bone_parent, make_active, \
-    bake_collision_object, remove_extension
+    bake_collision_object, remove_extension, get_lod_screen_sizes, get_vert_positions, \
+    isolate_evaluation, restore_evaluation, stitch_frame_shards, get_action_samples, make_action_from_samples, \
+    get_quaternion_groups, reduce_action_keys, collapse_static_channels, save_action_samples, load_action_samples, \
+    action_animates_rig, get_evaluation_dependencies, hash_rna_properties, decompose_matrices
+from .collision import simplify_collision_object
+from .mesh_tools import get_evaluated_mesh_arrays, save_vertex_data_texture, set_vertex_index_uvs
+from .decimate import hausdorff_distance
 
 
 prefs = bpy.context.preferences.addons[__package__].preferences
 
+# frames baked before and after each scene animation shard to compare neighbouring shards
+SCENE_SHARD_OVERLAP = 8
+# largest difference of neighbouring shards that is not reported
+SCENE_SHARD_SEAM_TOLERANCE = 0.001
+
+# baked actions are cached in this folder of the animation folder, change the version if baking changes
+BAKE_CACHE_FOLDER_NAME = ".bake_cache"
+BAKE_CACHE_VERSION = 1
+
+# lod0 + lod triangles above which the error of a lod isn't measured on export, the error budget it was generated with is used instead
+LOD_ERROR_MAX_TRIANGLES = 2000000
+
+# background worker processes still running after this many seconds are killed
+WORKER_TIMEOUT = 3600
+
+
+# python expression that runs function_name of this module in a background blender, the add-on may not be enabled
+# in the preferences that blender starts with, it's enabled first (preferences aren't saved in the background)
+def get_worker_expression(function_name):
+    return "\n".join((
+        "import addon_utils, importlib",
+        "if not addon_utils.check('" + __package__ + "')[1]:",
+        "    addon_utils.enable('" + __package__ + "', default_set=True)",
+        "importlib.import_module('" + __name__ + "')." + function_name + "()"
+        ))
+
     
 # main ops    
 class Op_GYAZ_Export_Export (Operator):
@@ -52,6 +86,11 @@ class Op_GYAZ_Export_Export (Operator):
             ),
         default='DO_NOT_OVERRIDE', options={'SKIP_SAVE'})
     
+    # set when running in a worker process, which exports from the .blend saved by the main process
+    worker: BoolProperty (default=False, options={'HIDDEN', 'SKIP_SAVE'})
+    # json list of the action names a worker process exports, in the action export mode of the main process
+    worker_actions: StringProperty (default="", options={'HIDDEN', 'SKIP_SAVE'})
+    
     # operator function
     def execute (self, context):
         
@@ -68,9 +107,14 @@ class Op_GYAZ_Export_Export (Operator):
         asset_type = scene_gyaz_export.skeletal_asset_type if ori_ao.type == 'ARMATURE' else scene_gyaz_export.rigid_asset_type 
 
         mesh_children = [child for child in ori_ao.children if child.type == 'MESH' and child.gyaz_export.export]
+        vertex_animation_meshes = []
 
         if asset_type == "ANIMATIONS":
-            if scene_gyaz_export.skeletal_shapes:
+            if scene_gyaz_export.vertex_animation:
+                # meshes are baked to textures, not exported with the animation
+                vertex_animation_meshes = mesh_children
+                mesh_children = []
+            elif scene_gyaz_export.skeletal_shapes:
                 # don't export meshes with no shape keys
                 for obj in mesh_children.copy():
                     if obj.data.shape_keys is None or len(obj.data.shape_keys.key_blocks) == 0:
@@ -162,6 +206,7 @@ class Op_GYAZ_Export_Export (Operator):
         # and imported one by one
         asset_type_with_lod = asset_type == 'STATIC_MESHES'
         export_lods = asset_type_with_lod and scene_gyaz_export.export_lods
+        export_skeletal_lods = asset_type == 'SKELETAL_MESHES' and scene_gyaz_export.export_lods
 
         lod_pattern = make_lod_object_name_pattern()
 
@@ -202,6 +247,9 @@ class Op_GYAZ_Export_Export (Operator):
 
         lod_set = set()
 
+        # {lod_obj: lod_idx}
+        lod_levels = {}
+
         for obj in meshes_to_export:
             obj_name_wo_lod = obj_to_obj_name_wo_lod_map[obj]
             lods = []
@@ -211,12 +259,16 @@ class Op_GYAZ_Export_Export (Operator):
                 if obj is not lod_obj and lod_idx > 0:
                     lods.append(lod_obj)
                     lod_set.add(lod_obj)
+                    lod_levels[lod_obj] = lod_idx
             lod_info[obj] = (lods, obj_name_wo_lod)
 
         meshes_to_export += list(lod_set)
         
         ori_sel_objs = list(set(ori_sel_objs) - lod_set)
         mesh_children = list(set(mesh_children) - lod_set)
+
+        # skeletal mesh lods are processed like mesh children, then exported to a file per lod level
+        skeletal_lods = [lod for lod in lod_set if lod.parent is ori_ao] if export_skeletal_lods else []
             
         ###############################################################
         # GATHER COLLISION & SOCKETS
@@ -320,12 +372,12 @@ class Op_GYAZ_Export_Export (Operator):
                             
                             
                     elif action_export_mode == 'ALL':
-                        if len (bpy.data.actions) > 0:
+                        if any (action_animates_rig (action, ori_ao) for action in bpy.data.actions):
                             if scene_gyaz_export.pack_actions and is_str_blank(scene_gyaz_export.global_anim_name):
                                 report (self, 'Action pack name is invalid.', 'WARNING')
                                 return {"CANCELLED"}
                         else:
-                            report (self, 'No actions found in this .blend file.', 'WARNING')
+                            report (self, 'No actions in this .blend file animate the bones of the active armature.', 'WARNING')
                             return {"CANCELLED"}
 
                             
@@ -778,9 +830,18 @@ class Op_GYAZ_Export_Export (Operator):
             if image.users == 0:
                 image.use_fake_user = True
 
-        bpy.ops.wm.save_as_mainfile (filepath=blend_path)
+        if not self.worker:
+            bpy.ops.wm.save_as_mainfile (filepath=blend_path)
             
         ###############################################################
+        
+        # split actions between background blender processes, each exports its share from the saved file
+        if asset_type == 'ANIMATIONS' and scene_gyaz_export.animation_workers > 0 and not self.worker \
+            and action_export_mode != 'SCENE' and not scene_gyaz_export.pack_actions and not scene_gyaz_export.vertex_animation:
+            
+            action_names = [action.name for action in self.gather_actions_to_export(ori_ao)]
+            self.export_actions_in_workers(blend_path, ori_ao.name, action_names, scene_gyaz_export.animation_workers)
+            return {'FINISHED'}
 
         self.make_every_collection_and_object_visible_in_scene(scene)
         
@@ -1068,13 +1129,13 @@ class Op_GYAZ_Export_Export (Operator):
             bpy.ops.object.transform_apply (location=False, rotation=False, scale=True, properties=False)
             final_rig.delta_scale = (0.01, 0.01, 0.01)
         
-            for child in mesh_children:
+            for child in mesh_children + skeletal_lods:
                 child.delta_scale[0] *= 100
                 child.delta_scale[1] *= 100
                 child.delta_scale[2] *= 100
 
             # bind meshes to the final rig
-            for child in mesh_children:
+            for child in mesh_children + skeletal_lods:
                 child.parent = final_rig
                 child.matrix_parent_inverse = final_rig.matrix_world.inverted ()
                 child.parent_type = 'ARMATURE'
@@ -1138,7 +1199,7 @@ class Op_GYAZ_Export_Export (Operator):
             
             # rename vert groups to match extra bone names
             if rename_vert_groups_to_extra_bones:   
-                for mesh in mesh_children:
+                for mesh in mesh_children + skeletal_lods:
                     vgroups = mesh.vertex_groups
                     for item in scene_gyaz_export.extra_bones:
                         vgroup = vgroups.get (item.source)
@@ -1146,7 +1207,7 @@ class Op_GYAZ_Export_Export (Operator):
                             vgroup.name = item.name
                             
             # make sure armature modifier points to the final rig
-            for ob in mesh_children:
+            for ob in mesh_children + skeletal_lods:
                 for m in ob.modifiers:
                     if m.type == 'ARMATURE':
                         m.object = final_rig
@@ -1163,7 +1224,7 @@ class Op_GYAZ_Export_Export (Operator):
             
             limit_prop = scene_gyaz_export.skeletal_mesh_limit_bone_influences
             
-            for child in mesh_children:
+            for child in mesh_children + skeletal_lods:
                 if len (child.vertex_groups) > 0:
                     make_active_only (child)
 
@@ -1262,7 +1323,8 @@ class Op_GYAZ_Export_Export (Operator):
                 mesh.update()
 
             
-        # collision         
+        # collision
+        simplified_hull_lines = []
         for obj in collision_objects:
             if obj.type == 'MESH':
                 mesh = obj.data
@@ -1278,6 +1340,20 @@ class Op_GYAZ_Export_Export (Operator):
                 name = obj.name
                 if name.startswith("UBX_") or name.startswith("UCP_"):
                     bake_collision_object(obj)
+                    
+                elif name.startswith("UCX_") and scene_gyaz_export.simplify_collision_hulls:
+                    counts = simplify_collision_object(obj, scene_gyaz_export.collision_hull_max_verts, scene_gyaz_export.collision_hull_max_faces)
+                    if counts is not None:
+                        (verts_before, faces_before), (verts_after, faces_after) = counts
+                        simplified_hull_lines.append('{0}: {1} verts, {2} faces --> {3} verts, {4} faces'.format(
+                            name, verts_before, faces_before, verts_after, faces_after))
+        
+        if len(simplified_hull_lines) > 0:
+            print ('')
+            print ('Simplified collision hulls:')
+            for line in simplified_hull_lines:
+                print (line)
+            report (self, 'Simplified ' + str(len(simplified_hull_lines)) + ' collision hull(s), see console.', 'INFO')
 
 
         ############################################################
@@ -1346,6 +1422,84 @@ class Op_GYAZ_Export_Export (Operator):
                 scene.render.image_settings.color_depth = set_depth
                 scene.render.image_settings.compression = set_compresssion
                 
+        ########################################################
+        # LOD SCREEN SIZES
+        ########################################################
+
+        # lods can be exported to more than one file, radii and errors are measured once per export
+        lod_radii = {}
+        lod_errors = {}
+        
+        # world space mesh arrays without translation, lods may be offset
+        def get_lod_mesh_arrays (lod):
+            mesh_arrays = get_evaluated_mesh_arrays (lod)
+            matrix = np.array (lod.matrix_world)[:3, :3]
+            mesh_arrays['positions'] = mesh_arrays['positions'] @ matrix.T
+            return mesh_arrays
+        
+        # measures the simplification error of every lod against lod0 in world space, unless Generate LODs stored its 
+        # error budget, and writes screen sizes to the lod groups and to a .lods.json file next to filepath
+        def set_lod_screen_sizes (filepath, lod_groups):
+            
+            radii = np.zeros (len (lod_groups))
+            errors = np.full ((len (lod_groups), max (len (lods) for empty, lods in lod_groups) - 1), np.nan)
+            
+            jobs = []
+            unmeasured_lods = []
+            for group_idx, (empty, lods) in enumerate (lod_groups):
+                lods_to_measure = []
+                for lod_idx, lod in enumerate (lods[1:], 1):
+                    if lod.name in lod_errors:
+                        errors[group_idx, lod_idx - 1] = lod_errors[lod.name]
+                    elif lod.get ("gyaz_lod_error") is not None:
+                        errors[group_idx, lod_idx - 1] = lod_errors[lod.name] = lod["gyaz_lod_error"]
+                    else:
+                        lods_to_measure.append (lod_idx)
+                if lods[0].name in lod_radii and len (lods_to_measure) == 0:
+                    radii[group_idx] = lod_radii[lods[0].name]
+                    continue
+                
+                lod0_mesh_arrays = get_lod_mesh_arrays (lods[0])
+                positions = lod0_mesh_arrays['positions']
+                if len (positions) > 0:
+                    center = (positions.min (axis=0) + positions.max (axis=0)) * .5
+                    radii[group_idx] = np.linalg.norm (positions - center, axis=1).max ()
+                lod_radii[lods[0].name] = radii[group_idx]
+                for lod_idx in lods_to_measure:
+                    mesh_arrays = get_lod_mesh_arrays (lods[lod_idx])
+                    if len (lod0_mesh_arrays['triangles']) + len (mesh_arrays['triangles']) <= LOD_ERROR_MAX_TRIANGLES:
+                        jobs.append ((group_idx, lod_idx, lod0_mesh_arrays, mesh_arrays))
+                    else:
+                        unmeasured_lods.append (lods[lod_idx].name)
+            
+            # numpy releases the gil for most of the measuring
+            with ThreadPoolExecutor () as executor:
+                distances = list (executor.map (lambda job: hausdorff_distance (job[2], job[3]), jobs))
+            for (group_idx, lod_idx, lod0_mesh_arrays, mesh_arrays), distance in zip (jobs, distances):
+                errors[group_idx, lod_idx - 1] = distance
+                lod_errors[lod_groups[group_idx][1][lod_idx].name] = distance
+            
+            if len (unmeasured_lods) > 0:
+                report (self, "Too many triangles to measure the error of " + ", ".join (unmeasured_lods) + 
+                        " and no error budget from Generate LODs (Max Error), their screen sizes are 0.", 'WARNING')
+            
+            screen_sizes = get_lod_screen_sizes (radii, errors, scene_gyaz_export.lod_pixel_error, scene_gyaz_export.lod_screen_height)
+            
+            lod_data = {}
+            for group_idx, (empty, lods) in enumerate (lod_groups):
+                group_screen_sizes = screen_sizes[group_idx, :len (lods)].tolist ()
+                group_errors = [0.0] + errors[group_idx, :len (lods) - 1].tolist ()
+                empty['screen_sizes'] = group_screen_sizes
+                empty['bounding_sphere_radius'] = float (radii[group_idx])
+                lod_data[empty.name] = {
+                    'bounding_sphere_radius': float (radii[group_idx]), 
+                    'screen_sizes': group_screen_sizes,
+                    'errors': group_errors
+                    }
+            
+            with open (os.path.splitext (filepath)[0] + '.lods.json', 'w') as file:
+                json.dump ({'pixel_error': scene_gyaz_export.lod_pixel_error, 'screen_height': scene_gyaz_export.lod_screen_height, 'lod_groups': lod_data}, file, indent=4)
+        
         ########################################################
         # EXPORT OBJECTS FUNCTION 
         ###########################################################       
@@ -1363,6 +1517,9 @@ class Op_GYAZ_Export_Export (Operator):
                 ex_tex_only = scene_gyaz_export.export_only_textures
                     
                 final_selected_objects = objects + collision_objects + sockets
+
+                # [(lod group, [lod0, lod1, ...])]
+                lod_groups = []
                 
                 # set up LOD Groups and select LOD objects
                 if export_lods:
@@ -1376,6 +1533,7 @@ class Op_GYAZ_Export_Export (Operator):
                                 empty = bpy.data.objects.new (name='LOD_' + obj_name_wo_lod, object_data=None)
                                 empty['fbx_type'] = 'LodGroup'
                                 scene.collection.objects.link (empty)
+                                lod_groups.append ((empty, [obj] + lods))
                             
                                 for lod in lods + [obj]:
                                     lod.parent = empty
@@ -1386,6 +1544,14 @@ class Op_GYAZ_Export_Export (Operator):
                             else:
                                 final_selected_objects.append (obj)
 
+                    if scene_gyaz_export.lod_screen_sizes and len (lod_groups) > 0:
+                        set_lod_screen_sizes (filepath, lod_groups)
+                        # custom properties are exported for the screen sizes, not the bookkeeping of Generate LODs
+                        for empty, lods in lod_groups:
+                            for lod in lods:
+                                for key in [key for key in lod.keys () if key.startswith ("gyaz_lod_")]:
+                                    del lod[key]
+
                 if export_sockets:
                     for socket in sockets:
                         socket.scale = (1, 1, 1)
@@ -1418,7 +1584,7 @@ class Op_GYAZ_Export_Export (Operator):
                         object_types=fbx_settings.object_types, 
                         use_space_transform=fbx_settings.use_space_transform,
                         bake_space_transform=fbx_settings.bake_space_transform, 
-                        use_custom_props=fbx_settings.use_custom_props, 
+                        use_custom_props=fbx_settings.use_custom_props or scene_gyaz_export.lod_screen_sizes and len (lod_groups) > 0, 
                         path_mode=fbx_settings.path_mode, 
                         batch_mode=fbx_settings.batch_mode, 
                         use_mesh_modifiers=fbx_settings.use_mesh_modifiers, 
@@ -1503,6 +1669,12 @@ class Op_GYAZ_Export_Export (Operator):
                     
                     export_objects (filepath, objects = [final_rig] + mesh_children)
                     export_images (texture_root = root_folder)                
+                    
+                    # a file per lod level with the lods of all children
+                    for lod_idx in sorted (set (lod_levels[lod] for lod in skeletal_lods)):
+                        lods = [lod for lod in skeletal_lods if lod_levels[lod] == lod_idx]
+                        filepath = os.path.join(folder_path, prefix + pack_name + '_LOD' + str(lod_idx) + suffix + format)
+                        export_objects (filepath, objects = [final_rig] + lods)
                 
             else:
                 if len (mesh_children) > 0:
@@ -1520,6 +1692,12 @@ class Op_GYAZ_Export_Export (Operator):
                         
                         export_objects (filepath, objects = [final_rig, child])    
                         export_images (texture_root = root_folder)
+                        
+                        # a file per lod
+                        for lod in lod_info[child][0]:
+                            if lod in skeletal_lods:
+                                filepath = os.path.join(folder_path, prefix + child_name + '_LOD' + str(lod_levels[lod]) + suffix + format)
+                                export_objects (filepath, objects = [final_rig, lod])
                                         
                                 
         elif asset_type == 'ANIMATIONS':
@@ -1536,22 +1714,54 @@ class Op_GYAZ_Export_Export (Operator):
 
             separator = "_" if character_name != "" else ""
             
-            if action_export_mode == "SCENE":
+            def export_animation (filepath):
+                # the fbx exporter samples the baked actions again, only the rig and its children are evaluated while it does
+                isolation = isolate_evaluation ([final_rig] + mesh_children)
+                try:
+                    export_objects (filepath, objects = [final_rig] + mesh_children)
+                finally:
+                    restore_evaluation (isolation)
+            
+            if scene_gyaz_export.vertex_animation:
+                
+                if action_export_mode == "SCENE":
+                    clips = [(scene_gyaz_export.global_anim_name, None, scene.frame_start, scene.frame_end)]
+                else:
+                    clips = [(action.name, action, int(action.frame_range[0]), int(action.frame_range[1])) for action in self.gather_actions_to_export(ori_ao)]
+                
+                folder_path = os.path.join(root_folder, anims_folder)
+                rest_objects = self.bake_vertex_animation(ori_ao, vertex_animation_meshes, clips, folder_path, character_name + separator + "VAT")
+                if rest_objects is not None:
+                    prefix = static_mesh_prefix if not character_name.startswith(static_mesh_prefix) else ''
+                    filepath = os.path.join(folder_path, prefix + character_name + separator + "VAT" + static_mesh_suffix + format)
+                    export_objects (filepath, objects = rest_objects)
+            
+            elif action_export_mode == "SCENE":
                 
                 fbx_settings.bake_anim = True
 
-                folder_path = os.path_join(root_folder, anims_folder)
+                folder_path = os.path.join(root_folder, anims_folder)
                 anim_name = sn(scene_gyaz_export.global_anim_name)
                 filepath = os.path.join(folder_path, animation_prefix + character_name + "_" + anim_name + animation_suffix + format)
                 os.makedirs (folder_path, exist_ok=True) 
                 
-                baked_action = self.bake_action_from_scene(final_rig, scene_gyaz_export.global_anim_name)
-                self.unconstraint_rig(final_rig)
-                self.move_root_motion_from_bone_to_object(final_rig, root_bone_name, [baked_action])
+                shard_frames = scene_gyaz_export.scene_shard_frames
+                if shard_frames > 0 and scene.frame_end - scene.frame_start + 1 > shard_frames:
+                    worker_count = scene_gyaz_export.animation_workers if scene_gyaz_export.animation_workers > 0 else os.cpu_count()
+                    baked_action = self.bake_action_from_scene_in_shards(final_rig, scene_gyaz_export.global_anim_name, shard_frames, worker_count)
+                else:
+                    baked_action = self.bake_action_from_scene(final_rig, scene_gyaz_export.global_anim_name)
+                
+                # None if baking in shards failed
+                if baked_action is not None:
+                    self.unconstraint_rig(final_rig)
+                    self.move_root_motion_from_bone_to_object(final_rig, root_bone_name, [baked_action])
+                    if scene_gyaz_export.reduce_keys or scene_gyaz_export.collapse_static_channels:
+                        self.simplify_baked_actions([baked_action])
 
-                self.set_animation_name(scene_gyaz_export.global_anim_name)
+                    self.set_animation_name(scene_gyaz_export.global_anim_name)
 
-                export_objects (filepath, objects = [final_rig] + mesh_children) 
+                    export_animation (filepath)
 
             # actions
             else:
@@ -1559,9 +1769,32 @@ class Op_GYAZ_Export_Export (Operator):
                 
                 fbx_settings.bake_anim = True 
 
-                baked_actions = self.bake_actions_from_ori_to_final_rig(ori_ao, final_rig, actions_to_export)
+                # actions baked by a previous export with the same source curves, rig and settings are loaded from the cache
+                cache_paths = {}
+                if scene_gyaz_export.use_bake_cache:
+                    cache_folder = os.path.join(root_folder, anims_folder, BAKE_CACHE_FOLDER_NAME)
+                    os.makedirs (cache_folder, exist_ok=True)
+                    rig_hash = self.get_rig_bake_hash(ori_ao, bone_list)
+                    if rig_hash is None:
+                        report(self, "Baked actions are not cached, drivers of '" + ori_ao.name + "' or its constraint targets read data other than objects.", 'INFO')
+                    else:
+                        for action in actions_to_export:
+                            cache_paths[action] = os.path.join(cache_folder, self.get_bake_hash(rig_hash, action) + ".npz")
+                actions_to_bake = [action for action in actions_to_export if not os.path.isfile(cache_paths.get(action, ""))]
+
+                baked_actions = self.bake_actions_from_ori_to_final_rig(ori_ao, final_rig, actions_to_bake)
                 self.unconstraint_rig(final_rig) 
                 self.move_root_motion_from_bone_to_object(final_rig, root_bone_name, baked_actions)
+                
+                if len(cache_paths) > 0:
+                    baked_by_source = dict(zip(actions_to_bake, baked_actions))
+                    for action, baked_action in baked_by_source.items():
+                        save_action_samples(cache_paths[action], baked_action)
+                    baked_actions = [baked_by_source[action] if action in baked_by_source else self.load_cached_action(action, cache_paths[action]) 
+                                     for action in actions_to_export]
+                    report(self, "Loaded " + str(len(actions_to_export) - len(actions_to_bake)) + " of " + str(len(actions_to_export)) + " baked actions from the cache.", 'INFO')
+                if scene_gyaz_export.reduce_keys or scene_gyaz_export.collapse_static_channels:
+                    self.simplify_baked_actions(baked_actions)
                 set_active_action (ori_ao, None)
                 
                 if scene_gyaz_export.pack_actions:
@@ -1579,7 +1812,7 @@ class Op_GYAZ_Export_Export (Operator):
                     filepath = os.path.join(folder_path, animation_prefix + character_name + separator + anim_name + animation_suffix + format)
                     os.makedirs (folder_path, exist_ok=True) 
 
-                    export_objects (filepath, objects = [final_rig] + mesh_children)
+                    export_animation (filepath)
 
                 else:
                     for baked_action in baked_actions:
@@ -1593,7 +1826,7 @@ class Op_GYAZ_Export_Export (Operator):
                         self.adjust_scene_to_action_length(baked_action)
                         self.set_animation_name(action_name)
                         
-                        export_objects (filepath, objects = [final_rig] + mesh_children)
+                        export_animation (filepath)
                         
 
         elif asset_type == 'RIGID_ANIMATIONS':
@@ -1630,6 +1863,12 @@ class Op_GYAZ_Export_Export (Operator):
                     export_images (texture_root = root_folder)
                     
             else:
+                
+                # {object: (frames, world matrices)}, baked back to the objects so the fbx exporter only evaluates their own fcurves
+                sampled_tracks = {}
+                if scene_gyaz_export.rigid_anim_single_sweep:
+                    sampled_tracks = self.sample_rigid_animations(ori_sel_objs)
+                    self.bake_rigid_animations(sampled_tracks)
             
                 for obj in ori_sel_objs:
 
@@ -1646,7 +1885,16 @@ class Op_GYAZ_Export_Export (Operator):
                     
                     os.makedirs(folder_path, exist_ok=True)
                     
-                    export_objects (filepath, objects = [obj])
+                    if obj in sampled_tracks:
+                        # nothing else is evaluated while the exporter samples the baked action
+                        exported_objects = [obj] + self.get_collision_objects_from_collision_info([obj], collision_info) + self.get_socket_objects_from_socket_info([obj], socket_info)
+                        isolation = isolate_evaluation (exported_objects)
+                        try:
+                            export_objects (filepath, objects = [obj])
+                        finally:
+                            restore_evaluation (isolation)
+                    else:
+                        export_objects (filepath, objects = [obj])
                     if not rigid_anim_cubes:
                         export_images (texture_root = root_folder)
         
@@ -1655,7 +1903,7 @@ class Op_GYAZ_Export_Export (Operator):
         # to restore the scene to the state before the exporting
         ###############################################################        
         
-        if not (scene_gyaz_export.show_debug_props and scene_gyaz_export.dont_reload_scene):
+        if not (scene_gyaz_export.show_debug_props and scene_gyaz_export.dont_reload_scene) and not self.worker:
             bpy.ops.wm.open_mainfile (filepath=blend_path)
         
         return {'FINISHED'}
@@ -1820,51 +2068,420 @@ class Op_GYAZ_Export_Export (Operator):
     def bake_actions_from_ori_to_final_rig(self, ori_rig, final_rig, actions):
         baked_actions = []
         scene = bpy.context.scene
+        isolation = isolate_evaluation([ori_rig, final_rig])
+        try:
+            for action in actions:
+                make_active_only (ori_rig)
+                set_active_action (ori_rig, action)
+                self.adjust_scene_to_action_length(action)
+                make_active_only (final_rig)
+                bpy.ops.nla.bake (frame_start=scene.frame_start, frame_end=scene.frame_end, only_selected=False, 
+                                  visual_keying=True, clear_constraints=False, clear_parents=False, use_current_action=False, 
+                                  bake_types={'POSE'})
+                new_action = get_active_action (final_rig)
+                action_name = action.name
+                action.name = "GYAZ_Export_OLD_" + action_name
+                new_action.name = action_name
+                new_action.name = action_name
+                baked_actions.append(new_action)
+        finally:
+            restore_evaluation(isolation)
+        return baked_actions
 
-        for action in actions:
-            make_active_only (ori_rig)
-            set_active_action (ori_rig, action)
-            self.adjust_scene_to_action_length(action)
-            make_active_only (final_rig)
-            bpy.ops.nla.bake (frame_start=scene.frame_start, frame_end=scene.frame_end, only_selected=False, 
-                              visual_keying=True, clear_constraints=False, clear_parents=False, use_current_action=False, 
-                              bake_types={'POSE'})
-            new_action = get_active_action (final_rig)
-            action_name = action.name
-            action.name = "GYAZ_Export_OLD_" + action_name
-            new_action.name = action_name
-            new_action.name = action_name
-            baked_actions.append(new_action)
 
-        return baked_actions
+    def bake_vertex_animation(self, rig, meshes, clips, folder_path, name):
+        # clips: (name, action or None to keep the current animation, frame_start, frame_end)
+        # positions and normals are sampled in the space of the rig, offsets are in centimeters
+        scene = bpy.context.scene
+        scene_gyaz_export = scene.gyaz_export
+        file_format = scene_gyaz_export.vertex_animation_format
+
+        def sample_meshes():
+            depsgraph = bpy.context.evaluated_depsgraph_get()
+            rig_inverse = np.array(rig.evaluated_get(depsgraph).matrix_world.inverted())
+            positions = []
+            normals = []
+            for obj in meshes:
+                obj_eval = obj.evaluated_get(depsgraph)
+                mesh = obj_eval.to_mesh()
+                matrix = rig_inverse @ np.array(obj_eval.matrix_world)
+                obj_normals = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+                mesh.vertices.foreach_get("normal", obj_normals)
+                positions.append(get_vert_positions(mesh) @ matrix[:3, :3].T + matrix[:3, 3])
+                obj_normals = obj_normals.reshape(-1, 3) @ np.linalg.inv(matrix[:3, :3])
+                normals.append(obj_normals / np.maximum(np.linalg.norm(obj_normals, axis=1, keepdims=True), 1e-12))
+                obj_eval.to_mesh_clear()
+            return np.concatenate(positions), np.concatenate(normals)
+
+        if len(meshes) == 0 or len(clips) == 0:
+            report(self, "Nothing to bake to vertex animation textures, no mesh children or actions found.", 'WARNING')
+            return None
+
+        # rest pose meshes with every modifier applied
+        rig.data.pose_position = 'REST'
+        try:
+            bpy.context.view_layer.update()
+            depsgraph = bpy.context.evaluated_depsgraph_get()
+            rest_positions = sample_meshes()[0]
+            rest_objects = []
+            for obj in meshes:
+                rest_mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph))
+                rest_mesh.transform(rig.matrix_world.inverted() @ obj.matrix_world)
+                rest_obj = bpy.data.objects.new(name=obj.name + "_VAT", object_data=rest_mesh)
+                scene.collection.objects.link(rest_obj)
+                rest_objects.append(rest_obj)
+        finally:
+            # the animation is sampled in pose position
+            rig.data.pose_position = 'POSE'
+
+        offset_blocks = []
+        normal_blocks = []
+        frame_ranges = []
+        for clip_name, action, frame_start, frame_end in clips:
+            if action is not None:
+                set_active_action(rig, action)
+            frame_ranges.append({"name": clip_name, "first_frame": len(offset_blocks), "frame_count": frame_end - frame_start + 1})
+            for frame in range(frame_start, frame_end + 1):
+                scene.frame_set(frame)
+                positions, normals = sample_meshes()
+                if len(positions) != len(rest_positions):
+                    report(self, "Vertex count of the mesh children changes during '" + clip_name + "', they can't be baked to vertex animation textures.", 'WARNING')
+                    return None
+                offset_blocks.append((positions - rest_positions) * 100)
+                normal_blocks.append(normals)
+
+        offset_blocks = np.stack(offset_blocks)
+        normal_blocks = np.stack(normal_blocks)
+        offset_min = float(offset_blocks.min())
+        offset_max = float(offset_blocks.max())
+        if file_format == 'PNG':
+            # no negative values in png, offsets are remapped to 0-1 between min and max, normals from -1-1
+            offset_blocks = (offset_blocks - offset_min) / max(offset_max - offset_min, 1e-12)
+            normal_blocks = (normal_blocks + 1) * 0.5
+
+        save_vertex_data_texture(name + "_Offsets", offset_blocks, folder_path, file_format)
+        filepath, width, block_height = save_vertex_data_texture(name + "_Normals", normal_blocks, folder_path, file_format)
+
+        # a texture shared by all rest meshes, the pixels of a mesh start after the ones of the previous meshes
+        first_vert_idx = 0
+        for rest_obj in rest_objects:
+            set_vertex_index_uvs(rest_obj.data, "VertexIndex", width, block_height * len(offset_blocks), first_vert_idx)
+            first_vert_idx += len(rest_obj.data.vertices)
+
+        # what a shader needs to decode the textures, frame n of a clip is row block first_frame + n
+        info = {
+            "vertex_count": len(rest_positions),
+            "texture_width": width,
+            "texture_height": block_height * len(offset_blocks),
+            "block_height": block_height,
+            "fps": scene.render.fps,
+            "offset_min": offset_min,
+            "offset_max": offset_max,
+            "clips": frame_ranges
+        }
+        with open(os.path.join(folder_path, sn(name) + ".json"), "w") as file:
+            json.dump(info, file, indent=4)
+
+        report(self, "Baked " + str(len(clips)) + " clips, " + str(len(offset_blocks)) + " frames to vertex animation textures.", 'INFO')
+
+        return rest_objects
 
 
     def bake_action_from_scene(self, rig, new_action_name):
         scene = bpy.context.scene
-        make_active_only (rig)
-        bpy.ops.nla.bake (frame_start=scene.frame_start, frame_end=scene.frame_end, only_selected=False, 
-                          visual_keying=True, clear_constraints=False, clear_parents=False, use_current_action=False, 
-                          bake_types={'POSE'})
+        isolation = isolate_evaluation([rig])
+        try:
+            make_active_only (rig)
+            bpy.ops.nla.bake (frame_start=scene.frame_start, frame_end=scene.frame_end, only_selected=False, 
+                              visual_keying=True, clear_constraints=False, clear_parents=False, use_current_action=False, 
+                              bake_types={'POSE'})
+        finally:
+            restore_evaluation(isolation)
         new_action = get_active_action (rig)
         new_action.name = new_action_name
         new_action.name = new_action_name
         return new_action
 
 
+    def export_actions_in_workers(self, blend_path, rig_name, action_names, worker_count):
+        
+        shares = [action_names[i::worker_count] for i in range(worker_count)]
+        shares = [share for share in shares if len(share) > 0]
+        expression = get_worker_expression("run_action_export_worker")
+        
+        with tempfile.TemporaryDirectory(prefix="gyaz_export_workers_") as temp_dir:
+            
+            workers = []
+            for share_idx, share in enumerate(shares):
+                args_path = os.path.join(temp_dir, "worker_" + str(share_idx) + ".json")
+                result_path = os.path.join(temp_dir, "result_" + str(share_idx) + ".json")
+                log_path = os.path.join(temp_dir, "log_" + str(share_idx) + ".txt")
+                error_log_path = os.path.join(temp_dir, "error_log_" + str(share_idx) + ".txt")
+                with open(args_path, "w") as file:
+                    json.dump({
+                        "rig": rig_name,
+                        "action_export_mode": bpy.context.scene.gyaz_export.action_export_mode,
+                        "actions": share,
+                        "result_path": result_path
+                        }, file)
+                
+                log = open(log_path, "w")
+                error_log = open(error_log_path, "w")
+                process = subprocess.Popen(
+                    [bpy.app.binary_path, "--background", blend_path, "--python-expr", expression, "--", args_path],
+                    stdout=log, stderr=error_log, creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)
+                    )
+                workers.append((process, log, error_log, share, result_path, log_path, error_log_path))
+            
+            # the workers export in the background, report when each of them finishes,
+            # the ones still running after WORKER_TIMEOUT are killed
+            window_manager = bpy.context.window_manager
+            window_manager.progress_begin(0, len(workers))
+            deadline = time.monotonic() + WORKER_TIMEOUT
+            running = list(range(len(workers)))
+            while len(running) > 0 and time.monotonic() < deadline:
+                time.sleep(0.1)
+                for worker_idx in [worker_idx for worker_idx in running if workers[worker_idx][0].poll() is not None]:
+                    running.remove(worker_idx)
+                    print("GYAZ Export: worker " + str(worker_idx + 1) + " of " + str(len(workers)) + " finished, " + str(len(running)) + " running")
+                    window_manager.progress_update(len(workers) - len(running))
+            for worker_idx in running:
+                process = workers[worker_idx][0]
+                process.kill()
+                process.wait()
+            window_manager.progress_end()
+            
+            exported_count = 0
+            failed_actions = []
+            errors = []
+            for worker_idx, (process, log, error_log, share, result_path, log_path, error_log_path) in enumerate(workers):
+                log.close()
+                error_log.close()
+                result = None
+                if worker_idx not in running and os.path.isfile(result_path):
+                    with open(result_path) as file:
+                        result = json.load(file)
+                if result is not None and "FINISHED" in result["result"]:
+                    exported_count += len(share)
+                    continue
+                
+                failed_actions.extend(share)
+                with open(log_path, errors="replace") as file:
+                    print(file.read())
+                with open(error_log_path, errors="replace") as file:
+                    error_lines = [line for line in file.read().splitlines() if line.strip() != ""]
+                print("\n".join(error_lines))
+                if worker_idx in running:
+                    errors.append("worker " + str(worker_idx + 1) + " killed after " + str(WORKER_TIMEOUT) + " seconds")
+                elif len(error_lines) > 0:
+                    errors.append("worker " + str(worker_idx + 1) + ": " + error_lines[-1])
+                else:
+                    errors.append("worker " + str(worker_idx + 1) + " exited with code " + str(process.returncode))
+        
+        if len(failed_actions) == 0:
+            report(self, "Exported " + str(exported_count) + " actions in " + str(len(shares)) + " worker processes.", 'INFO')
+        else:
+            report(self, "Exported " + str(exported_count) + " actions, workers failed to export: " + list_to_visual_list(failed_actions) + 
+                   " (" + list_to_visual_list(errors) + "). See the console for their output.", 'WARNING')
+
+
+    def bake_action_from_scene_in_shards(self, rig, new_action_name, shard_frames, worker_count):
+        scene = bpy.context.scene
+        frame_start = scene.frame_start
+        frame_end = scene.frame_end
+        # frames each shard contributes, the shards are baked with SCENE_SHARD_OVERLAP more frames on both sides
+        cores = [(first, min(first + shard_frames - 1, frame_end)) for first in range(frame_start, frame_end + 1, shard_frames)]
+        expression = get_worker_expression("run_scene_bake_worker")
+        
+        with tempfile.TemporaryDirectory(prefix="gyaz_export_shards_") as temp_dir:
+            
+            # workers bake from the current state of the scene, with the final rig set up
+            blend_path = os.path.join(temp_dir, "scene.blend")
+            bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+            
+            def bake_shard(shard_idx):
+                first, last = cores[shard_idx]
+                args_path = os.path.join(temp_dir, "shard_" + str(shard_idx) + ".json")
+                result_path = os.path.join(temp_dir, "shard_" + str(shard_idx) + ".npz")
+                with open(args_path, "w") as file:
+                    json.dump({
+                        "rig": rig.name,
+                        "frame_start": max(frame_start, first - SCENE_SHARD_OVERLAP),
+                        "frame_end": min(frame_end, last + SCENE_SHARD_OVERLAP),
+                        "result_path": result_path
+                        }, file)
+                # returns (samples, None) or (None, why the shard failed)
+                try:
+                    process = subprocess.run(
+                        [bpy.app.binary_path, "--background", blend_path, "--python-expr", expression, "--", args_path],
+                        capture_output=True, timeout=WORKER_TIMEOUT, creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)
+                        )
+                except subprocess.TimeoutExpired:
+                    return None, "killed after " + str(WORKER_TIMEOUT) + " seconds"
+                
+                error_lines = [line for line in process.stderr.decode(errors="replace").splitlines() if line.strip() != ""]
+                try:
+                    with np.load(result_path) as data:
+                        return {key: data[key] for key in ("frames", "values", "data_paths", "array_indices", "group_names")}, None
+                except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as error:
+                    print(process.stdout.decode(errors="replace"))
+                    print("\n".join(error_lines))
+                    return None, error_lines[-1] if len(error_lines) > 0 else "no readable result (" + str(error) + ")"
+            
+            with ThreadPoolExecutor(max_workers=worker_count) as executor:
+                results = list(executor.map(bake_shard, range(len(cores))))
+        
+        # no partial animation is stitched from the shards that succeeded
+        errors = ["frames " + str(first) + "-" + str(last) + ": " + error for (first, last), (result, error) in zip(cores, results) if error is not None]
+        if len(errors) > 0:
+            report(self, "Baking scene animation in shards failed, not exported (" + list_to_visual_list(errors) + "). See the console for the output of the shards.", 'WARNING')
+            return None
+        results = [result for result, error in results]
+        if any(not np.array_equal(result["data_paths"], results[0]["data_paths"]) or 
+               not np.array_equal(result["array_indices"], results[0]["array_indices"]) for result in results):
+            report(self, "Baking scene animation in shards failed, the shards baked different channels, not exported.", 'WARNING')
+            return None
+        
+        data_paths = results[0]["data_paths"].tolist()
+        array_indices = results[0]["array_indices"].tolist()
+        group_names = results[0]["group_names"].tolist()
+        shards = [(result["frames"], result["values"]) for result in results]
+        frames, values, seam_error = stitch_frame_shards(shards, cores, get_quaternion_groups(data_paths, array_indices))
+        
+        new_action = make_action_from_samples(new_action_name, data_paths, array_indices, group_names, frames, values)
+        new_action.name = new_action_name
+        set_active_action(rig, new_action)
+        
+        if seam_error > SCENE_SHARD_SEAM_TOLERANCE:
+            report(self, "Scene animation shards differ by up to " + str(round(seam_error, 4)) + " where they overlap, the animation may jump at frames " + 
+                   list_to_visual_list([str(first) for first, last in cores[1:]]) + ".", 'WARNING')
+        
+        return new_action
+
+
+    def hash_fcurves(self, h, fcurves):
+        for fcurve in fcurves:
+            h.update((fcurve.data_path + "[" + str(fcurve.array_index) + "]" + fcurve.extrapolation + str(fcurve.mute)).encode())
+            for prop in ("co", "handle_left", "handle_right"):
+                values = np.empty(len(fcurve.keyframe_points) * 2, dtype=np.float32)
+                fcurve.keyframe_points.foreach_get(prop, values)
+                h.update(values.tobytes())
+            interpolations = np.empty(len(fcurve.keyframe_points), dtype=np.int32)
+            fcurve.keyframe_points.foreach_get("interpolation", interpolations)
+            h.update(interpolations.tobytes())
+            for modifier in fcurve.modifiers:
+                hash_rna_properties(h, modifier)
+
+
+    def get_rig_bake_hash(self, rig, bone_list):
+        # everything but the action the baked curves depend on: the rig, the objects it depends on and the export settings,
+        # None if drivers read data other than objects, changes of which can't be tracked
+        scene = bpy.context.scene
+        scene_gyaz_export = scene.gyaz_export
+        h = hashlib.sha1()
+        h.update(str(BAKE_CACHE_VERSION).encode())
+        
+        for obj in sorted(get_evaluation_dependencies([rig]), key=lambda obj: obj.name):
+            h.update((obj.name + ":" + (obj.parent.name if obj.parent is not None else "") + obj.rotation_mode).encode())
+            h.update(np.array(obj.matrix_world, dtype=np.float32).tobytes())
+            constraints = list(obj.constraints)
+            
+            # rest and current pose, bones the action doesn't key keep the current pose
+            if obj.type == 'ARMATURE':
+                matrices = np.empty(len(obj.data.bones) * 16, dtype=np.float32)
+                obj.data.bones.foreach_get("matrix_local", matrices)
+                h.update(matrices.tobytes())
+                for pbone in obj.pose.bones:
+                    h.update((pbone.name + ":" + (pbone.parent.name if pbone.parent is not None else "") + pbone.rotation_mode).encode())
+                    h.update(np.array(pbone.matrix_basis, dtype=np.float32).tobytes())
+                    constraints.extend(pbone.constraints)
+            
+            # every parameter of every constraint
+            for c in constraints:
+                hash_rna_properties(h, c)
+            
+            # animation of constraint targets, the action of the rig itself is hashed per action
+            if obj != rig:
+                action = get_active_action(obj)
+                if action is not None:
+                    self.hash_fcurves(h, action.fcurves)
+            
+            for anim_owner in (obj, obj.data):
+                animation_data = getattr(anim_owner, "animation_data", None)
+                if animation_data is None:
+                    continue
+                for fcurve in animation_data.drivers:
+                    for variable in fcurve.driver.variables:
+                        for target in variable.targets:
+                            if target.id is not None and not isinstance(target.id, bpy.types.Object):
+                                return None
+                    hash_rna_properties(h, fcurve.driver)
+                self.hash_fcurves(h, animation_data.drivers)
+        
+        # export settings
+        extra_bones = [(item.name, item.source, item.parent) for item in scene_gyaz_export.extra_bones]
+        h.update(repr((bone_list, extra_bones, scene_gyaz_export.root_mode, scene_gyaz_export.root_bone_name, 
+                       scene_gyaz_export.skeletal_clear_transforms, scene.render.fps)).encode())
+        return h.hexdigest()
+
+
+    def get_bake_hash(self, rig_hash, action):
+        # everything the baked curves of action depend on
+        h = hashlib.sha1(rig_hash.encode())
+        h.update(np.array(action.frame_range).tobytes())
+        self.hash_fcurves(h, action.fcurves)
+        return h.hexdigest()
+
+
+    def load_cached_action(self, action, cache_path):
+        # same naming as bake_actions_from_ori_to_final_rig
+        action_name = action.name
+        action.name = "GYAZ_Export_OLD_" + action_name
+        new_action = load_action_samples(cache_path, action_name)
+        new_action.name = action_name
+        return new_action
+
+
+    def simplify_baked_actions(self, actions):
+        scene_gyaz_export = bpy.context.scene.gyaz_export
+        tolerances = (scene_gyaz_export.reduce_keys_location, scene_gyaz_export.reduce_keys_rotation, scene_gyaz_export.reduce_keys_scale)
+        for action in actions:
+            key_count = sum(len(fcurve.keyframe_points) for fcurve in action.fcurves)
+            removed_count = 0
+            message = "'" + action.name + "': "
+            if scene_gyaz_export.collapse_static_channels:
+                static_count, rest_count, removed_static_count = collapse_static_channels(action, *tolerances)
+                removed_count += removed_static_count
+                message += str(static_count) + " of " + str(len(action.fcurves)) + " channels static (" + str(rest_count) + " in rest pose), "
+            if scene_gyaz_export.reduce_keys:
+                removed_count += reduce_action_keys(action, *tolerances)
+            report(self, message + "removed " + str(removed_count) + " of " + str(key_count) + " keys.", 'INFO')
+
+
     def gather_actions_to_export(self, obj):
         actions_to_export = []
         scene = bpy.context.scene
         action_export_mode = scene.gyaz_export.action_export_mode
         all_actions = bpy.data.actions
 
+        if self.worker and self.worker_actions != "":
+            return [all_actions[action_name] for action_name in json.loads(self.worker_actions)]
+
         if action_export_mode == 'ACTIVE':
             active_action = get_active_action(obj)
             if active_action is not None: 
                 actions_to_export.append (active_action)
                 
         elif action_export_mode == 'ALL':
+            # only actions that animate bones of the rig
+            skipped_actions = []
             for action in bpy.data.actions:
-                actions_to_export.append (all_actions[action.name])
+                if action_animates_rig (action, obj):
+                    actions_to_export.append (all_actions[action.name])
+                else:
+                    skipped_actions.append (action.name)
+            if len (skipped_actions) > 0:
+                report (self, 'Skipped ' + str (len (skipped_actions)) + " actions that don't animate bones of '" + obj.name + "': " + list_to_visual_list (skipped_actions), 'INFO')
                 
         elif action_export_mode == 'BY_NAME':
             for item in scene.gyaz_export.actions:
@@ -1873,6 +2490,81 @@ class Op_GYAZ_Export_Export (Operator):
         return actions_to_export
     
     
+    def sample_rigid_animations(self, objects):
+        # world matrices of every animated object over its action range, sampled in one sweep over the frames of all ranges,
+        # returns {object: (frames, matrices of shape (frame_count, 4, 4))}
+        scene = bpy.context.scene
+        animated_objects = []
+        for obj in objects:
+            if get_active_action(obj) is None:
+                continue
+            # shape key animation is left to the fbx exporter
+            shape_keys = obj.data.shape_keys if obj.type == 'MESH' else None
+            if shape_keys is not None and shape_keys.animation_data is not None:
+                continue
+            animated_objects.append(obj)
+        if len(animated_objects) == 0:
+            return {}
+        
+        frame_ranges = []
+        for obj in animated_objects:
+            frame_start, frame_end = get_active_action(obj).frame_range
+            frame_ranges.append(np.arange(int(frame_start), int(frame_end) + 1))
+        frames = np.unique(np.concatenate(frame_ranges))
+        
+        # object transforms don't depend on their modifiers
+        disabled_modifiers = []
+        for obj in animated_objects:
+            for modifier in obj.modifiers:
+                if modifier.show_viewport:
+                    modifier.show_viewport = False
+                    disabled_modifiers.append(modifier)
+        isolation = isolate_evaluation(animated_objects)
+        
+        matrices = np.empty((len(animated_objects), len(frames), 4, 4))
+        frame_current = scene.frame_current
+        try:
+            for frame_idx, frame in enumerate(frames.tolist()):
+                scene.frame_set(frame)
+                for obj_idx, obj in enumerate(animated_objects):
+                    matrices[obj_idx, frame_idx] = obj.matrix_world
+        finally:
+            scene.frame_set(frame_current)
+            restore_evaluation(isolation)
+            for modifier in disabled_modifiers:
+                modifier.show_viewport = True
+        
+        return {obj: (obj_frames, matrices[obj_idx, np.searchsorted(frames, obj_frames)]) 
+                for obj_idx, (obj, obj_frames) in enumerate(zip(animated_objects, frame_ranges))}
+
+
+    def bake_rigid_animations(self, sampled_tracks):
+        # replaces the transform animation of every sampled object with its world matrices as a linear action, 
+        # an object is exported without its parent, so its world matrix is its transform in the file
+        transform_paths = {"location", "rotation_euler", "rotation_quaternion", "rotation_axis_angle", "scale", 
+                           "delta_location", "delta_rotation_euler", "delta_rotation_quaternion", "delta_scale"}
+        for obj, (frames, matrices) in sampled_tracks.items():
+            translations, rotations, scales = decompose_matrices(matrices[np.newaxis])
+            values = np.concatenate((translations[0].T, rotations[0].T, scales[0].T))
+            data_paths = ["location"] * 3 + ["rotation_euler"] * 3 + ["scale"] * 3
+            baked_action = make_action_from_samples(get_active_action(obj).name, data_paths, [0, 1, 2] * 3, ["Object Transforms"] * 9, frames, values)
+            for fcurve in baked_action.fcurves:
+                for keyframe in fcurve.keyframe_points:
+                    keyframe.interpolation = 'LINEAR'
+            
+            clear_blender_collection(obj.constraints)
+            for fcurve in list(obj.animation_data.drivers):
+                if fcurve.data_path in transform_paths:
+                    obj.animation_data.drivers.remove(fcurve)
+            obj.parent = None
+            obj.rotation_mode = 'XYZ'
+            obj.delta_location = (0, 0, 0)
+            obj.delta_rotation_euler = (0, 0, 0)
+            obj.delta_rotation_quaternion = (1, 0, 0, 0)
+            obj.delta_scale = (1, 1, 1)
+            obj.animation_data.action = baked_action
+
+
     def adjust_scene_to_action_length(self, action):
         scene = bpy.context.scene
         frame_start, frame_end = action.frame_range
@@ -1977,6 +2669,47 @@ class Op_GYAZ_Export_Export (Operator):
         return ao is not None
 
 
+# entry point of worker processes started by export_actions_in_workers,
+# exports a share of the actions with BY_NAME mode and writes the result next to the arguments
+def run_action_export_worker():
+    with open(sys.argv[sys.argv.index("--") + 1]) as file:
+        args = json.load(file)
+    
+    scene = bpy.context.scene
+    scene_gyaz_export = scene.gyaz_export
+    # same mode as the main process, export behaves differently for ACTIVE and the other modes
+    scene_gyaz_export.action_export_mode = args["action_export_mode"]
+    
+    make_active_only(scene.objects[args["rig"]])
+    result = bpy.ops.object.gyaz_export_export(worker=True, worker_actions=json.dumps(args["actions"]))
+    
+    with open(args["result_path"], "w") as file:
+        json.dump({"result": sorted(result)}, file)
+
+
+# entry point of worker processes started by bake_action_from_scene_in_shards,
+# bakes the rig over a frame range and saves the samples of every fcurve
+def run_scene_bake_worker():
+    with open(sys.argv[sys.argv.index("--") + 1]) as file:
+        args = json.load(file)
+    
+    scene = bpy.context.scene
+    rig = scene.objects[args["rig"]]
+    scene.frame_start = args["frame_start"]
+    scene.frame_end = args["frame_end"]
+    
+    isolate_evaluation([rig])
+    make_active_only(rig)
+    bpy.ops.nla.bake (frame_start=scene.frame_start, frame_end=scene.frame_end, only_selected=False, 
+                      visual_keying=True, clear_constraints=False, clear_parents=False, use_current_action=False, 
+                      bake_types={'POSE'})
+    
+    frames = np.arange(scene.frame_start, scene.frame_end + 1)
+    data_paths, array_indices, group_names, values = get_action_samples(get_active_action(rig), frames)
+    np.savez(args["result_path"], frames=frames, values=values, data_paths=np.array(data_paths), 
+             array_indices=np.array(array_indices), group_names=np.array(group_names))
+
+
 #######################################################
 #######################################################
 
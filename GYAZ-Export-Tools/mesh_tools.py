@@ -20,11 +20,301 @@
 ##########################################################################################################
 ##########################################################################################################
 
-import bpy, bmesh
+import bpy, os, sys, subprocess, tempfile, hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from bpy.props import *
 from bpy.types import Operator, PropertyGroup, Mesh, Scene
-from mathutils import Vector
-from .utils import report, delete_object
+from mathutils.bvhtree import BVHTree
+from .utils import report, sn, delete_object, get_vert_positions, make_lod_object_name_pattern, get_name_and_lod_index
+from .decimate import decimate_job, encode_edges, save_mesh_arrays, load_mesh_arrays
+
+
+# triangulated mesh data as NumPy arrays, the format decimate.py works with
+def get_mesh_arrays (mesh):
+    mesh.calc_loop_triangles ()
+    loop_tris = mesh.loop_triangles
+    tri_count = len (loop_tris)
+    
+    triangles = np.empty (tri_count * 3, dtype=np.int32)
+    loop_tris.foreach_get ("vertices", triangles)
+    loops = np.empty (tri_count * 3, dtype=np.int32)
+    loop_tris.foreach_get ("loops", loops)
+    materials = np.empty (tri_count, dtype=np.int32)
+    loop_tris.foreach_get ("material_index", materials)
+    polygon_indices = np.empty (tri_count, dtype=np.int32)
+    loop_tris.foreach_get ("polygon_index", polygon_indices)
+    
+    smooth = np.empty (len (mesh.polygons), dtype=bool)
+    mesh.polygons.foreach_get ("use_smooth", smooth)
+    
+    uvs = np.empty ((len (mesh.uv_layers), tri_count, 3, 2), dtype=np.float32)
+    loop_uvs = np.empty (len (mesh.loops) * 2, dtype=np.float32)
+    for uv_idx, uv_layer in enumerate (mesh.uv_layers):
+        uv_layer.data.foreach_get ("uv", loop_uvs)
+        uvs[uv_idx] = loop_uvs.reshape (-1, 2)[loops].reshape (-1, 3, 2)
+    
+    edge_count = len (mesh.edges)
+    edges = np.empty (edge_count * 2, dtype=np.int32)
+    mesh.edges.foreach_get ("vertices", edges)
+    edges = edges.reshape (-1, 2)
+    seams = np.empty (edge_count, dtype=bool)
+    mesh.edges.foreach_get ("use_seam", seams)
+    sharps = np.empty (edge_count, dtype=bool)
+    mesh.edges.foreach_get ("use_edge_sharp", sharps)
+    
+    return {
+        'positions': get_vert_positions (mesh).astype (np.float64),
+        'triangles': triangles.reshape (-1, 3),
+        'uvs': uvs,
+        'materials': materials,
+        'smooth': smooth[polygon_indices],
+        'seam_edges': edges[seams],
+        'sharp_edges': edges[sharps],
+    }
+
+
+def get_evaluated_mesh_arrays (obj):
+    obj_eval = obj.evaluated_get (bpy.context.evaluated_depsgraph_get ())
+    mesh = obj_eval.to_mesh ()
+    mesh_arrays = get_mesh_arrays (mesh)
+    obj_eval.to_mesh_clear ()
+    return mesh_arrays
+
+
+# unit vectors (n, 3) to octahedral coordinates (n, 2) remapped to 0-1
+def encode_octahedral (normals):
+    normals = normals / np.maximum (np.abs (normals).sum (axis=1, keepdims=True), 1e-12)
+    uvs = normals[:, :2].copy ()
+    # fold the lower hemisphere over the diagonals
+    lower = normals[:, 2] < 0
+    uvs[lower] = (1 - np.abs (normals[lower][:, [1, 0]])) * np.where (normals[lower][:, :2] >= 0, 1, -1)
+    return uvs * 0.5 + 0.5
+
+
+# split normals of every loop triangle corner (m, 3, 3), in the same triangle order as get_mesh_arrays
+def get_corner_normals (mesh):
+    mesh.calc_loop_triangles ()
+    loops = np.empty (len (mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get ("loops", loops)
+    normals = np.empty (len (mesh.loops) * 3, dtype=np.float32)
+    mesh.corner_normals.foreach_get ("vector", normals)
+    return normals.reshape (-1, 3)[loops].reshape (-1, 3, 3)
+
+
+def get_evaluated_corner_normals (obj):
+    obj_eval = obj.evaluated_get (bpy.context.evaluated_depsgraph_get ())
+    mesh = obj_eval.to_mesh ()
+    normals = get_corner_normals (mesh)
+    obj_eval.to_mesh_clear ()
+    return normals
+
+
+def get_armature (obj):
+    for m in obj.modifiers:
+        if m.type == 'ARMATURE' and m.object is not None:
+            return m.object
+    return None
+
+
+# vertex group weights as a (vert_count, group_count) matrix
+def get_vertex_weights (obj):
+    mesh = obj.data
+    group_count = len (obj.vertex_groups)
+    weights = np.zeros ((len (mesh.vertices), group_count), dtype=np.float32)
+    # there is no bulk access to vertex group weights, gather them in one pass and assign them at once
+    elements = [(vert.index, element.group, element.weight) for vert in mesh.vertices for element in vert.groups]
+    if len (elements) > 0:
+        vert_indices, group_indices, values = np.array (elements).T
+        vert_indices = vert_indices.astype (np.int64)
+        group_indices = group_indices.astype (np.int64)
+        valid = group_indices < group_count
+        weights[vert_indices[valid], group_indices[valid]] = values[valid]
+    return weights
+
+
+# weights are set in steps of 1 / WEIGHT_STEPS, finer than the 8 or 16 bits engines store them in
+WEIGHT_STEPS = 65535
+
+
+# replaces all vertex groups of obj
+def set_vertex_weights (obj, group_names, weights):
+    obj.vertex_groups.clear ()
+    for group_idx, name in enumerate (group_names):
+        group = obj.vertex_groups.new (name=name)
+        # one add call per distinct weight, quantized so there are at most WEIGHT_STEPS of them
+        column = np.round (weights[:, group_idx] * WEIGHT_STEPS) / WEIGHT_STEPS
+        vert_indices = np.flatnonzero (column)
+        order = np.argsort (column[vert_indices], kind='stable')
+        vert_indices = vert_indices[order]
+        values = column[vert_indices]
+        splits = np.flatnonzero (np.diff (values)) + 1
+        for value_vert_indices, value in zip (np.split (vert_indices, splits), values[np.concatenate (([0], splits))].tolist ()):
+            group.add (value_vert_indices.tolist (), value, "REPLACE")
+
+
+# {bone name: closest kept ancestor or None} for the bones removed at lod_idx,
+# bones matching one of name_filters are removed once the height of their bone chain (leaf bones are 0) is below lod_idx,
+# so every lod level removes one more level of fingers, face bones etc.
+def get_bone_collapse_map (armature, name_filters, lod_idx):
+    heights = {}
+    
+    def get_height (bone):
+        height = heights.get (bone.name)
+        if height is None:
+            height = max ((get_height (child) + 1 for child in bone.children), default=0)
+            heights[bone.name] = height
+        return height
+    
+    removed_bones = set ()
+    for bone in armature.data.bones:
+        name = bone.name.lower ()
+        if any (name_filter in name for name_filter in name_filters) and get_height (bone) < lod_idx:
+            removed_bones.add (bone.name)
+    
+    collapse_map = {}
+    for name in removed_bones:
+        parent = armature.data.bones[name].parent
+        while parent is not None and parent.name in removed_bones:
+            parent = parent.parent
+        collapse_map[name] = parent.name if parent is not None else None
+    return collapse_map
+
+
+# adds the weights of collapsed bones to their target bones, returns new group names and weights
+def collapse_bone_weights (group_names, weights, collapse_map):
+    group_names = list (group_names)
+    for name, target in collapse_map.items ():
+        if name not in group_names or target is None:
+            continue
+        if target not in group_names:
+            group_names.append (target)
+            weights = np.concatenate ((weights, np.zeros ((len (weights), 1), dtype=weights.dtype)), axis=1)
+        weights[:, group_names.index (target)] += weights[:, group_names.index (name)]
+    kept = [group_idx for group_idx, name in enumerate (group_names) if name not in collapse_map]
+    return [group_names[group_idx] for group_idx in kept], weights[:, kept]
+
+
+# nearest surface normal transfer, every corner of mesh_arrays gets the source split normal interpolated
+# at the closest point of the source surface, returns (m * 3, 3) normals in triangle corner order
+def transfer_corner_normals (source_mesh_arrays, source_corner_normals, mesh_arrays):
+    source_positions = source_mesh_arrays['positions']
+    source_triangles = source_mesh_arrays['triangles']
+    bvh = BVHTree.FromPolygons (source_positions.tolist (), source_triangles.tolist (), all_triangles=True)
+    
+    # query from slightly inside the corner's own triangle so corners on hard edges find the face on their side
+    corners = mesh_arrays['positions'][mesh_arrays['triangles']]
+    query_points = (corners + (corners.mean (axis=1, keepdims=True) - corners) * .01).reshape (-1, 3)
+    
+    locations = query_points.copy ()
+    tri_indices = np.zeros (len (query_points), dtype=np.int64)
+    for point_idx, point in enumerate (query_points.tolist ()):
+        location, normal, tri_idx, distance = bvh.find_nearest (point)
+        if tri_idx is not None:
+            locations[point_idx] = location
+            tri_indices[point_idx] = tri_idx
+    
+    # barycentric weights of the closest points
+    tris = source_positions[source_triangles[tri_indices]]
+    v0 = tris[:, 1] - tris[:, 0]
+    v1 = tris[:, 2] - tris[:, 0]
+    v2 = locations - tris[:, 0]
+    d00 = np.einsum ('ij,ij->i', v0, v0)
+    d01 = np.einsum ('ij,ij->i', v0, v1)
+    d11 = np.einsum ('ij,ij->i', v1, v1)
+    d20 = np.einsum ('ij,ij->i', v2, v0)
+    d21 = np.einsum ('ij,ij->i', v2, v1)
+    denom = d00 * d11 - d01 * d01
+    degenerate = np.abs (denom) < 1e-30
+    denom[degenerate] = 1.0
+    w1 = np.where (degenerate, 1/3, (d11 * d20 - d01 * d21) / denom)
+    w2 = np.where (degenerate, 1/3, (d00 * d21 - d01 * d20) / denom)
+    weights = np.stack ((1 - w1 - w2, w1, w2), axis=1)
+    
+    normals = np.einsum ('ij,ijk->ik', weights, source_corner_normals[tri_indices])
+    return normals / np.maximum (np.linalg.norm (normals, axis=1, keepdims=True), 1e-12)
+
+
+def set_edge_flags (mesh, flagged_edges, prop):
+    if len (flagged_edges) > 0:
+        vert_count = len (mesh.vertices)
+        edges = np.empty (len (mesh.edges) * 2, dtype=np.int32)
+        mesh.edges.foreach_get ("vertices", edges)
+        flags = np.isin (encode_edges (edges, vert_count), encode_edges (flagged_edges, vert_count))
+        mesh.edges.foreach_set (prop, flags)
+
+
+def hash_mesh_arrays (mesh_arrays):
+    h = hashlib.sha1 ()
+    for name in sorted (mesh_arrays):
+        h.update (name.encode ())
+        h.update (np.ascontiguousarray (mesh_arrays[name]).tobytes ())
+    return h.hexdigest ()
+
+
+# decimates every (mesh_idx, target_tri_count, max_error) job, each job runs decimate.py in its own python process,
+# as many at a time as there are cores, max_error is None for a fixed triangle count
+def decimate_in_processes (mesh_arrays_list, jobs):
+    script_path = os.path.join (os.path.dirname (__file__), "decimate.py")
+    
+    with tempfile.TemporaryDirectory (prefix="gyaz_export_lods_") as temp_dir:
+        
+        input_paths = []
+        for mesh_idx, mesh_arrays in enumerate (mesh_arrays_list):
+            path = os.path.join (temp_dir, "mesh_" + str (mesh_idx) + ".npz")
+            save_mesh_arrays (path, mesh_arrays)
+            input_paths.append (path)
+        
+        def run_job (job_idx):
+            mesh_idx, target_tri_count, max_error = jobs[job_idx]
+            output_path = os.path.join (temp_dir, "lod_" + str (job_idx) + ".npz")
+            args = [sys.executable, script_path, input_paths[mesh_idx], output_path, str (target_tri_count)]
+            if max_error is not None:
+                args.append (str (max_error))
+            process = subprocess.run (
+                args,
+                capture_output=True, creationflags=getattr (subprocess, "CREATE_NO_WINDOW", 0)
+                )
+            if process.returncode == 0:
+                return load_mesh_arrays (output_path)
+            
+            # worker failed, decimate in this process instead
+            print (process.stderr.decode (errors="replace"))
+            return decimate_job (mesh_arrays_list[mesh_idx], target_tri_count, max_error)
+        
+        with ThreadPoolExecutor (max_workers=os.cpu_count ()) as executor:
+            return list (executor.map (run_job, range (len (jobs))))
+
+
+# new mesh from mesh arrays, uv maps and materials are named after / copied from source_mesh
+def make_mesh_from_arrays (name, mesh_arrays, source_mesh):
+    positions = mesh_arrays['positions']
+    triangles = mesh_arrays['triangles']
+    tri_count = len (triangles)
+    
+    mesh = bpy.data.meshes.new (name=name)
+    mesh.vertices.add (len (positions))
+    mesh.vertices.foreach_set ("co", positions.astype (np.float32).ravel ())
+    mesh.loops.add (tri_count * 3)
+    mesh.loops.foreach_set ("vertex_index", triangles.astype (np.int32).ravel ())
+    mesh.polygons.add (tri_count)
+    mesh.polygons.foreach_set ("loop_start", np.arange (0, tri_count * 3, 3, dtype=np.int32))
+    mesh.polygons.foreach_set ("material_index", mesh_arrays['materials'].astype (np.int32))
+    mesh.polygons.foreach_set ("use_smooth", mesh_arrays['smooth'].astype (bool))
+    
+    for source_uv_layer, uvs in zip (source_mesh.uv_layers, mesh_arrays['uvs']):
+        uv_layer = mesh.uv_layers.new (name=source_uv_layer.name)
+        uv_layer.data.foreach_set ("uv", uvs.astype (np.float32).ravel ())
+    
+    mesh.update (calc_edges=True)
+    
+    set_edge_flags (mesh, mesh_arrays['seam_edges'], "use_seam")
+    set_edge_flags (mesh, mesh_arrays['sharp_edges'], "use_edge_sharp")
+    
+    for material in source_mesh.materials:
+        mesh.materials.append (material)
+    
+    return mesh
 
 
 class PG_GYAZ_Export_EncodeShapeKeysInUVChannel (PropertyGroup):
@@ -74,6 +364,10 @@ class PG_GYAZ_Export_EncodeShapeKeysInUVChannel (PropertyGroup):
     shape_key_mesh_5: PointerProperty (type = bpy.types.Object, name='Shape Mesh 5', update=update_shape_mesh_5)
     shape_nor_to_vert_col: EnumProperty (name='Shape Normal To Vert Color', items=(('None', 'None', ''), ('0', 'Shape 1', ''), ('1', 'Shape 2', ''), ('2', 'Shape 3', ''), ('3', 'Shape 4', ''), ('4', 'Shape 5', '')), default='None')    
     encode_normals: BoolProperty (name='Normals', description='Whether to encode normals, too for higher quality')
+    texture_normals: BoolProperty (name='Normals', description='Write shape normals to the morph texture, too')
+    texture_format: EnumProperty (name='Format', items=(('OPEN_EXR', 'EXR (Float)', 'Offsets are stored as they are, in centimeters'), ('PNG', 'PNG (16 bit)', 'Offsets are remapped to 0-1 between the morph_offset_min and morph_offset_max custom properties of Base Mesh')), default='OPEN_EXR')
+    texture_folder: StringProperty (name='Folder', subtype='DIR_PATH', default='//')
+    octahedral_normals: BoolProperty (name='Octahedral', description='Store each normal in 2 components with octahedral encoding instead of 3 so 3 shapes with normals fit in the uv maps. Shapes are packed in pairs: ShapeA_WPOxy, ShapeA_WPOz_NORu, ShapeA_NORv_ShapeB_WPOx, ShapeB_WPOyz, ShapeB_NORuv')
     
     
 class Op_GYAZ_Export_EncodeShapeKeysInUVChannels (Operator):
@@ -110,150 +404,101 @@ class Op_GYAZ_Export_EncodeShapeKeysInUVChannels (Operator):
 
         def main (uv_maps):
 
-            def set_uvs_by_vert (vert, co, uv_layer):
-                for loop in vert.link_loops:
-                    loop[uv_layer].uv = co
+            loop_verts = np.empty (len (base_mesh.loops), dtype=np.int32)
+            base_mesh.loops.foreach_get ("vertex_index", loop_verts)
+            base_positions = get_vert_positions (base_mesh)
+            zeros = np.zeros (len (base_positions), dtype=np.float32)
+
+            # position offsets, scaled by 100
+            def get_offsets (shape_mesh):
+                return (get_vert_positions (shape_mesh) - base_positions) * 100
+
+            def read_normals (shape_mesh):
+                normals = np.empty (len (shape_mesh.vertices) * 3, dtype=np.float32)
+                shape_mesh.vertices.foreach_get ("normal", normals)
+                return normals.reshape (-1, 3)
+
+            # normals remapped to 0-1
+            def get_normals (shape_mesh):
+                return (read_normals (shape_mesh) + 1) * 0.5
             
             if owner.encode_normals and shape_3 == None or not owner.encode_normals and shape_5 == None:
                 if len (uv_maps) == 0:
                     uv_maps.new (name='UVMap')
             
-            if owner.encode_normals:
-                
-                uv_map_1 = uv_maps.new (name='Shape1_WPOxy')
-                uv_map_2 = uv_maps.new (name='Shape1_WPOz_NORx')
-                uv_map_3 = uv_maps.new (name='Shape1_NORyz')
+            # [(uv map name, per vertex u, per vertex v)]
+            channels = []
+            
+            if owner.encode_normals and owner.octahedral_normals:
                 
-                if shape_2 is not None:
-                    uv_map_4 = uv_maps.new (name='Shape2_WPOxy')
-                    uv_map_5 = uv_maps.new (name='Shape2_WPOz_NORx')
-                    uv_map_6 = uv_maps.new (name='Shape2_NORyz')
-                    
-                if shape_3 is not None:
-                    uv_map_7 = uv_maps.new (name='Shape3_WPOxy')
-                    uv_map_8 = uv_maps.new (name='Shape3_WPOz')                    
+                shapes = []
+                for shape_mesh in (shape_1, shape_2, shape_3):
+                    if shape_mesh is None:
+                        break
+                    shapes.append (shape_mesh)
                 
-                bm = bmesh.new ()
-                bm.from_mesh (base_mesh)
+                # 5 components per shape, shapes are packed in pairs, 5 uv maps for 2 shapes
+                for shape_idx in range (0, len (shapes), 2):
+                    shape_name = 'Shape' + str (shape_idx + 1)
+                    vec = get_offsets (shapes[shape_idx])
+                    nor_oct = encode_octahedral (read_normals (shapes[shape_idx]))
+                    channels.append ((shape_name + '_WPOxy', -vec[:, 1], vec[:, 0]))
+                    channels.append ((shape_name + '_WPOz_NORu', vec[:, 2], nor_oct[:, 0]))
+                    if shape_idx + 1 < len (shapes):
+                        shape_name_2 = 'Shape' + str (shape_idx + 2)
+                        vec2 = get_offsets (shapes[shape_idx + 1])
+                        nor_oct2 = encode_octahedral (read_normals (shapes[shape_idx + 1]))
+                        channels.append ((shape_name + '_NORv_' + shape_name_2 + '_WPOx', nor_oct[:, 1], vec2[:, 1]))
+                        channels.append ((shape_name_2 + '_WPOyz', -vec2[:, 0], -vec2[:, 2]))
+                        channels.append ((shape_name_2 + '_NORuv', nor_oct2[:, 0], nor_oct2[:, 1]))
+                    else:
+                        channels.append ((shape_name + '_NORv', nor_oct[:, 1], zeros))
+            
+            elif owner.encode_normals:
                 
-                verts = bm.verts                
-                        
-                uv_layer_1 = bm.loops.layers.uv[uv_map_1.name]
-                uv_layer_2 = bm.loops.layers.uv[uv_map_2.name]
-                uv_layer_3 = bm.loops.layers.uv[uv_map_3.name]
+                def pack_data (shape_mesh, shape_name):
+                    vec = get_offsets (shape_mesh)
+                    nor = get_normals (shape_mesh)
+                    channels.append ((shape_name + '_WPOxy', -vec[:, 1], vec[:, 0]))
+                    channels.append ((shape_name + '_WPOz_NORx', vec[:, 2], nor[:, 1]))
+                    channels.append ((shape_name + '_NORyz', 1 - nor[:, 0], 1 - nor[:, 2]))
                 
+                pack_data (shape_1, 'Shape1')
                 if shape_2 is not None:
-                    uv_layer_4 = bm.loops.layers.uv[uv_map_4.name]
-                    uv_layer_5 = bm.loops.layers.uv[uv_map_5.name]
-                    uv_layer_6 = bm.loops.layers.uv[uv_map_6.name]
-                    
+                    pack_data (shape_2, 'Shape2')
                 if shape_3 is not None:
-                    uv_layer_7 = bm.loops.layers.uv[uv_map_7.name]
-                    uv_layer_8 = bm.loops.layers.uv[uv_map_8.name]
-                    
-
-                def pack_data (shape_key_mesh, vert_index, vert, uv_layer_1, uv_layer_2, uv_layer_3):
-                    vec = (shape_key_mesh.vertices[vert_index].co - vert.co) * 100
-                    nor = ( shape_key_mesh.vertices[vert_index].normal + Vector ((1, 1, 1)) ) * 0.5
-                    set_uvs_by_vert (vert, (-vec[1], vec[0]), uv_layer_1)
-                    set_uvs_by_vert (vert, (vec[2], nor[1]), uv_layer_2)
-                    set_uvs_by_vert (vert, (1-nor[0], 1-nor[2]), uv_layer_3)
-                
-                pack_shape_2 = True if shape_2 is not None else False
-                pack_shape_3 = True if shape_3 is not None else False
-                
-                for vert_index, vert in enumerate (verts):
-                    pack_data (shape_1, vert_index, vert, uv_layer_1, uv_layer_2, uv_layer_3)
-                    if pack_shape_2:
-                        pack_data (shape_2, vert_index, vert, uv_layer_4, uv_layer_5, uv_layer_6)
-                    if pack_shape_3:                   
-                        vec = (shape_3.vertices[vert_index].co - vert.co) * 100
-                        set_uvs_by_vert (vert, (-vec[1], vec[0]), uv_layer_7)
-                        set_uvs_by_vert (vert, (vec[2], 0), uv_layer_8)
+                    vec = get_offsets (shape_3)
+                    channels.append (('Shape3_WPOxy', -vec[:, 1], vec[:, 0]))
+                    channels.append (('Shape3_WPOz', vec[:, 2], zeros))
                         
             else:
                 
-                uv_map_1 = uv_maps.new (name='Shape1_WPOxy')
-                uv_map_2 = uv_maps.new (name='Shape1_WPOz')         
-                
-                if shape_2 is not None:
-                    uv_map_2.name = 'Shape1_WPOz_Shape2_WPOx'
-                    uv_map_3 = uv_maps.new (name='Shape2_WPOyz')
-                
-                    if shape_3 is not None:
-                        uv_map_4 = uv_maps.new (name='Shape3_WPOxy')
-                        uv_map_5 = uv_maps.new (name='Shape3_WPOz')
-                        
-                        if shape_4 is not None:
-                            uv_map_5.name = 'Shape3_WPOz_Shape4_WPOx'
-                            uv_map_6 = uv_maps.new (name='Shape4_WPOyz')
-                            
-                            if shape_5 is not None:
-                                uv_map_7 = uv_maps.new (name='Shape5_WPOxy')   
-                                uv_map_8 = uv_maps.new (name='Shape5_WPOz')                                
-                            
-                bm = bmesh.new ()
-                bm.from_mesh (base_mesh)
-                
-                verts = bm.verts
-                
-                uv_layer_1 = bm.loops.layers.uv[uv_map_1.name]
-                uv_layer_2 = bm.loops.layers.uv[uv_map_2.name]             
-                
-                if shape_2 is not None:
-                    uv_layer_3 = bm.loops.layers.uv[uv_map_3.name]  
-                
-                    if shape_3 is not None:
-                        uv_layer_4 = bm.loops.layers.uv[uv_map_4.name]
-                        uv_layer_5 = bm.loops.layers.uv[uv_map_5.name] 
-                        
-                        if shape_4 is not None:
-                            uv_layer_6 = bm.loops.layers.uv[uv_map_6.name]
-                            
-                            if shape_5 is not None:
-                                uv_layer_7 = bm.loops.layers.uv[uv_map_7.name]
-                                uv_layer_8 = bm.loops.layers.uv[uv_map_8.name]                                               
-                
-                
-                if shape_2 == None:
-                
-                    for vert_index, vert in enumerate (verts):
-                        vec = (shape_1.vertices[vert_index].co - vert.co) * 100
-                        set_uvs_by_vert (vert, (-vec[1], vec[0]), uv_layer_1)
-                        set_uvs_by_vert (vert, (vec[2], 0), uv_layer_2)
-                        
-                else:
-                    
-                    for vert_index, vert in enumerate (verts):
-                        vec = (shape_1.vertices[vert_index].co - vert.co) * 100
-                        vec2 = (shape_2.vertices[vert_index].co - vert.co) * 100
-                        set_uvs_by_vert (vert, (-vec[1], vec[0]), uv_layer_1)
-                        set_uvs_by_vert (vert, (vec[2], vec2[1]), uv_layer_2)                    
-                        set_uvs_by_vert (vert, (-vec2[0], -vec2[2]), uv_layer_3)                    
-                
-                    if shape_3 and not shape_4:
-                        
-                        for vert_index, vert in enumerate (verts):
-                            vec = (shape_3.vertices[vert_index].co - vert.co) * 100
-                            set_uvs_by_vert (vert, (-vec[1], vec[0]), uv_layer_4)
-                            set_uvs_by_vert (vert, (vec[2], 0), uv_layer_5)
-                            
-                    if shape_3 and shape_4:
-                        
-                        for vert_index, vert in enumerate (verts):
-                            vec = (shape_3.vertices[vert_index].co - vert.co) * 100
-                            vec2 = (shape_4.vertices[vert_index].co - vert.co) * 100
-                            set_uvs_by_vert (vert, (-vec[1], vec[0]), uv_layer_4)
-                            set_uvs_by_vert (vert, (vec[2], vec2[1]), uv_layer_5)                    
-                            set_uvs_by_vert (vert, (-vec2[0], -vec2[2]), uv_layer_6)
-                            
-                    if shape_5:
-                        
-                        for vert_index, vert in enumerate (verts):
-                            vec = (shape_5.vertices[vert_index].co - vert.co) * 100
-                            set_uvs_by_vert (vert, (-vec[1], vec[0]), uv_layer_7)
-                            set_uvs_by_vert (vert, (vec[2], 0), uv_layer_8)                        
+                shapes = []
+                for shape_mesh in (shape_1, shape_2, shape_3, shape_4, shape_5):
+                    if shape_mesh is None:
+                        break
+                    shapes.append (shape_mesh)
                 
+                # shapes are packed in pairs, 3 uv maps for 2 shapes
+                for shape_idx in range (0, len (shapes), 2):
+                    shape_name = 'Shape' + str (shape_idx + 1)
+                    vec = get_offsets (shapes[shape_idx])
+                    channels.append ((shape_name + '_WPOxy', -vec[:, 1], vec[:, 0]))
+                    if shape_idx + 1 < len (shapes):
+                        shape_name_2 = 'Shape' + str (shape_idx + 2)
+                        vec2 = get_offsets (shapes[shape_idx + 1])
+                        channels.append ((shape_name + '_WPOz_' + shape_name_2 + '_WPOx', vec[:, 2], vec2[:, 1]))
+                        channels.append ((shape_name_2 + '_WPOyz', -vec2[:, 0], -vec2[:, 2]))
+                    else:
+                        channels.append ((shape_name + '_WPOz', vec[:, 2], zeros))
+            
+            # create all uv maps first, adding a layer can invalidate references to the others
+            uv_map_names = [uv_maps.new (name=name).name for name, u, v in channels]
+            
+            # per vertex values are written to every loop of the vertex
+            for uv_map_name, (name, u, v) in zip (uv_map_names, channels):
+                uvs = np.stack ((u, v), axis=1)[loop_verts]
+                uv_maps[uv_map_name].data.foreach_set ("uv", uvs.astype (np.float32).ravel ())
              
             nor_to_vc = owner.shape_nor_to_vert_col           
             if nor_to_vc != 'None':
@@ -264,16 +509,13 @@ class Op_GYAZ_Export_EncodeShapeKeysInUVChannels (Operator):
                 
                 if shape_mesh is not None:
                     
-                    color_layer = bm.loops.layers.color.new ('Shape'+str(int(nor_to_vc)+1)+'_NOR')
-                    
-                    for vert_index, vert in enumerate (verts):
-                        nor = ( shape_mesh.vertices[vert_index].normal + Vector ((1, 1, 1)) ) * 0.5
-                        for loop in vert.link_loops:
-                            loop[color_layer] = 1-nor[1], 1-nor[0], nor[2], 1.0                   
-                        
-                
-            bm.to_mesh (base_mesh)
-            bm.free ()
+                    nor = get_normals (shape_mesh)
+                    colors = np.stack ((1 - nor[:, 1], 1 - nor[:, 0], nor[:, 2], np.ones (len (nor))), axis=1)[loop_verts]
+                    color_layer = base_mesh.color_attributes.new (name='Shape'+str(int(nor_to_vc)+1)+'_NOR', type='BYTE_COLOR', domain='CORNER')
+                    # byte colors are stored as they are, like bmesh loop colors
+                    color_layer.data.foreach_set ("color_srgb", colors.astype (np.float32).ravel ())
+            
+            base_mesh.update ()
         
             
         def call (limit):
@@ -290,11 +532,24 @@ class Op_GYAZ_Export_EncodeShapeKeysInUVChannels (Operator):
                 else:
                     main (uv_maps)
         
-        if base_mesh is not None and shape_1 is not None:
+        shape_meshes = [shape for shape in (shape_1, shape_2, shape_3, shape_4, shape_5) if shape is not None]
+        
+        if base_mesh is not None and any (len (shape.vertices) != len (base_mesh.vertices) for shape in shape_meshes):
+            report (self, 'Shape Meshes should have the same vertex count as Base Mesh.', 'WARNING')
+        
+        elif base_mesh is not None and shape_1 is not None:
             
             uv_maps = base_mesh.uv_layers
         
-            if owner.encode_normals:
+            if owner.encode_normals and owner.octahedral_normals:
+                
+                limit = 5
+                if shape_2 is not None:
+                    limit = 3
+                    if shape_3 is not None:
+                        limit = 0
+            
+            elif owner.encode_normals:
             
                 if shape_2 is not None:
                     limit = 2
@@ -329,6 +584,142 @@ class Op_GYAZ_Export_EncodeShapeKeysInUVChannels (Operator):
         return context.active_object is not None and context.mode == 'OBJECT'
 
 
+# longest row of a vertex data texture, longer meshes wrap to more rows
+DATA_TEXTURE_MAX_WIDTH = 8192
+
+
+# every vertex is a pixel, every block (vertex values of shape (vert_count, 3)) gets the same number of rows,
+# saves an rgba image to folder_path and returns (filepath, width, block_height)
+def save_vertex_data_texture (name, blocks, folder_path, file_format):
+    
+    scene = bpy.context.scene
+    block_count, vert_count = blocks.shape[:2]
+    width = min (vert_count, DATA_TEXTURE_MAX_WIDTH)
+    block_height = -(-vert_count // width)
+    height = block_height * block_count
+    
+    pixels = np.ones ((block_count, block_height * width, 4), dtype=np.float32)
+    pixels[:, :, :3] = 0
+    pixels[:, :vert_count, :3] = blocks
+    
+    image = bpy.data.images.new (name=name, width=width, height=height, alpha=True, float_buffer=True)
+    # data, no view transform on save
+    image.colorspace_settings.name = 'Non-Color'
+    image.pixels.foreach_set (pixels.ravel ())
+    
+    extension = '.exr' if file_format == 'OPEN_EXR' else '.png'
+    os.makedirs (folder_path, exist_ok=True)
+    filepath = os.path.join (folder_path, sn (name) + extension)
+    
+    # store current render settings
+    settings = scene.render.image_settings
+    set_format = settings.file_format
+    set_mode = settings.color_mode
+    set_depth = settings.color_depth
+    
+    settings.file_format = file_format
+    settings.color_mode = 'RGBA'
+    settings.color_depth = '32' if file_format == 'OPEN_EXR' else '16'
+    image.save_render (filepath)
+    
+    # restore previous render settings
+    settings.file_format = set_format
+    settings.color_mode = set_mode
+    settings.color_depth = set_depth
+    
+    bpy.data.images.remove (image)
+    
+    return filepath, width, block_height
+
+
+# uv of the pixel centers of the vertices in the first block of a vertex data texture,
+# vertices of the mesh start at pixel first_vert_idx, the block of a value is v + block_idx * block_height / height
+def set_vertex_index_uvs (mesh, uv_map_name, width, height, first_vert_idx=0):
+    vert_indices = np.arange (len (mesh.vertices)) + first_vert_idx
+    uvs = np.stack (((vert_indices % width + 0.5) / width, (vert_indices // width + 0.5) / height), axis=1)
+    loop_verts = np.empty (len (mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get ("vertex_index", loop_verts)
+    # encoding again overwrites the uv map of the previous run
+    uv_map = mesh.uv_layers.get (uv_map_name)
+    if uv_map is None:
+        uv_map = mesh.uv_layers.new (name=uv_map_name)
+    uv_map.data.foreach_set ("uv", uvs[loop_verts].astype (np.float32).ravel ())
+
+
+class Op_GYAZ_Export_EncodeShapeKeysInTexture (Operator):
+    
+    bl_idname = "object.gyaz_export_encode_shape_keys_in_texture"  
+    bl_label = "Encode Shape Keys In Texture"
+    bl_description = "Write position offsets (and normals) of all selected shape meshes, ordered by name, to a texture with a block of rows per shape. A MorphIndex uv map on Base Mesh points to the pixel of each vertex in the first block"
+    bl_options = {'REGISTER', 'UNDO'}
+            
+    # operator function
+    def execute(self, context):
+        
+        scene = bpy.context.scene
+        owner = scene.gyaz_export_shapes
+        base_obj = owner.base_mesh
+        
+        if base_obj is None:
+            report (self, 'Base Mesh has to be set.', 'WARNING')
+            return {'CANCELLED'}
+        
+        base_mesh = base_obj.data
+        vert_count = len (base_mesh.vertices)
+        shape_objs = sorted ((obj for obj in bpy.context.selected_objects if obj.type == 'MESH' and obj is not base_obj), key=lambda obj: obj.name)
+        
+        if len (shape_objs) == 0:
+            report (self, 'Select the shape meshes.', 'WARNING')
+            return {'CANCELLED'}
+        if any (len (obj.data.vertices) != vert_count for obj in shape_objs):
+            report (self, 'Shape Meshes should have the same vertex count as Base Mesh.', 'WARNING')
+            return {'CANCELLED'}
+        if len (base_mesh.uv_layers) >= 8 and base_mesh.uv_layers.get ('MorphIndex') is None:
+            report (self, 'Base Mesh has more than 7 uv maps.', 'WARNING')
+            return {'CANCELLED'}
+        
+        # every shape has a block of rows for offsets and optionally one for normals
+        base_positions = get_vert_positions (base_mesh)
+        offset_blocks = []
+        blocks = []
+        for shape_obj in shape_objs:
+            offset_blocks.append (len (blocks))
+            blocks.append ((get_vert_positions (shape_obj.data) - base_positions) * 100)
+            if owner.texture_normals:
+                normals = np.empty (vert_count * 3, dtype=np.float32)
+                shape_obj.data.vertices.foreach_get ("normal", normals)
+                blocks.append (normals.reshape (-1, 3))
+        blocks = np.stack (blocks)
+        
+        offset_min = float (blocks[offset_blocks].min ())
+        offset_max = float (blocks[offset_blocks].max ())
+        if owner.texture_format == 'PNG':
+            # no negative values in png, offsets are remapped to 0-1 between min and max, normals from -1-1
+            normal_blocks = np.setdiff1d (np.arange (len (blocks)), offset_blocks)
+            blocks[offset_blocks] = (blocks[offset_blocks] - offset_min) / max (offset_max - offset_min, 1e-12)
+            blocks[normal_blocks] = (blocks[normal_blocks] + 1) * 0.5
+        
+        folder_path = os.path.abspath (bpy.path.abspath (owner.texture_folder))
+        filepath, width, block_height = save_vertex_data_texture (base_obj.name + '_Morphs', blocks, folder_path, owner.texture_format)
+        set_vertex_index_uvs (base_mesh, 'MorphIndex', width, block_height * len (blocks))
+        
+        # what a shader needs to decode the texture
+        base_obj['morph_shape_count'] = len (shape_objs)
+        base_obj['morph_blocks_per_shape'] = 2 if owner.texture_normals else 1
+        base_obj['morph_block_height'] = block_height
+        base_obj['morph_offset_min'] = offset_min
+        base_obj['morph_offset_max'] = offset_max
+        
+        report (self, 'Wrote ' + str (len (shape_objs)) + ' shapes to ' + filepath + '.', 'INFO')
+        
+        return {'FINISHED'}
+    
+    #when the buttons should show up    
+    @classmethod
+    def poll(cls, context):
+        return context.active_object is not None and context.mode == 'OBJECT'
+
+
 class Op_GYAZ_Export_GenerateLODs (Operator):
     
     bl_idname = "object.gyaz_export_generate_lods"  
@@ -342,11 +733,18 @@ class Op_GYAZ_Export_GenerateLODs (Operator):
         name="Mode",
         items=(
             ("DECIMATE", "Decimate", ""),
-            ("DECIMATE_PRESERVE_SEAMS", "Decimate Preserving Seams", "")
+            ("DECIMATE_PRESERVE_SEAMS", "Decimate Preserving Seams", ""),
+            ("QEM", "Quadric Error (Applied)", "Simplify with the built-in quadric error decimator and apply the result. UV, material, flat shading and sharp edge seams are preserved")
         ),
         default="DECIMATE"
     )
+    use_max_error: BoolProperty(name="Error Driven", default=False, description="Quadric Error mode: give each LOD the fewest triangles that keep it within a maximum distance from the original instead of using the decimation ratio")
+    max_error: FloatProperty(name="Max Error", default=0.01, min=0.0, subtype='DISTANCE', description="Maximum distance between LOD1 and the original surface")
+    error_growth: FloatProperty(name="Error Growth", default=2.0, min=1.0, description="Max error multiplier from one LOD to the next")
     transfer_normals: BoolProperty(name="Transfer Normals", default=False)
+    bake_normals: BoolProperty(name="Bake Normals", default=True, description="Quadric Error mode: transfer normals once and store them as custom split normals of the lod mesh instead of adding a Data Transfer modifier")
+    reduce_bones: BoolProperty(name="Reduce Bones", default=False, description="Skinned meshes: collapse the weights of matching leaf bones into their parents, every LOD level removes one more level of bones")
+    reduced_bone_names: StringProperty(name="Bones", default="finger,thumb,index,middle,ring,pinky,eye,brow,lid,lip,jaw,cheek,tongue,teeth", description="Comma separated, case insensitive parts of the names of bones that may be reduced")
     lod_spacing: FloatProperty(name="Spacing", default=.2, min=0, description="Spacing between LOD objects")
     offset_axis: EnumProperty(
         name="Axis",
@@ -364,9 +762,20 @@ class Op_GYAZ_Export_GenerateLODs (Operator):
     def draw (self, context):
         lay = self.layout
         lay.prop(self, 'lod_count')
-        lay.prop(self, 'decimation_ratio')
         lay.prop(self, 'mode')
+        if self.mode == "QEM":
+            lay.prop(self, 'use_max_error')
+        if self.mode == "QEM" and self.use_max_error:
+            lay.prop(self, 'max_error')
+            lay.prop(self, 'error_growth')
+        else:
+            lay.prop(self, 'decimation_ratio')
         lay.prop(self, 'transfer_normals')
+        if self.mode == "QEM" and self.transfer_normals:
+            lay.prop(self, 'bake_normals')
+        lay.prop(self, 'reduce_bones')
+        if self.reduce_bones:
+            lay.prop(self, 'reduced_bone_names')
         lay.prop(self, 'lod_spacing')
         row = lay.row()
         row.label(text="Axis:")
@@ -381,11 +790,130 @@ class Op_GYAZ_Export_GenerateLODs (Operator):
 
     # operator function
     def execute(self, context):
-    
-        data_prefix = "GYAZExporterLOD_"
+
+        lod_pattern = make_lod_object_name_pattern()
+
+        def is_source_mesh(obj):
+            if obj is None or obj.type != 'MESH':
+                return False
+            # skip previously generated lods
+            info = get_name_and_lod_index(lod_pattern, obj.name)
+            return info is None or info[1] == 0
+
+        objs = [obj for obj in bpy.context.selected_objects if is_source_mesh(obj)]
+        if len(objs) == 0:
+            objs = [obj for obj in [bpy.context.object] if is_source_mesh(obj)]
+        if len(objs) == 0:
+            report (self, 'Select a mesh that is not a generated LOD.', 'WARNING')
+            return {'CANCELLED'}
+
+        ratios = []
+        ratio = 1.0
+        for lod_idx in range(1, self.lod_count + 1):
+            ratio /= self.decimation_ratio
+            ratios.append(ratio)
+
+        # read every mesh once, existing lods are only rebuilt if their source mesh or parameters changed
+        # skinned meshes are decimated before deformation and keep their modifiers, weights are carried over by vertex index
+        armatures = [get_armature(obj) for obj in objs]
+        base_mesh_arrays = []
+        source_weights = {}
+        source_hashes = []
+        for obj, armature in zip(objs, armatures):
+            if armature is None:
+                mesh_arrays = get_evaluated_mesh_arrays(obj)
+                source_hashes.append(hash_mesh_arrays(mesh_arrays))
+            else:
+                mesh_arrays = get_mesh_arrays(obj.data)
+                source_weights[obj] = get_vertex_weights(obj)
+                source_hashes.append(hash_mesh_arrays(dict(mesh_arrays, weights=source_weights[obj])))
+            base_mesh_arrays.append(mesh_arrays)
+
+        # meshes without faces (only loose vertices or edges) have nothing to decimate
+        empty_objs = [obj for obj, mesh_arrays in zip(objs, base_mesh_arrays) if len(mesh_arrays['triangles']) == 0]
+        if len(empty_objs) > 0:
+            report (self, 'Skipped meshes without faces: ' + ', '.join(obj.name for obj in empty_objs), 'WARNING')
+            kept = [obj_idx for obj_idx, obj in enumerate(objs) if obj not in empty_objs]
+            objs = [objs[obj_idx] for obj_idx in kept]
+            armatures = [armatures[obj_idx] for obj_idx in kept]
+            base_mesh_arrays = [base_mesh_arrays[obj_idx] for obj_idx in kept]
+            source_hashes = [source_hashes[obj_idx] for obj_idx in kept]
+            if len(objs) == 0:
+                return {'CANCELLED'}
+
+        lod_targets = []
+        build_levels = []
+        for obj, source_hash in zip(objs, source_hashes):
+            obj_name, lod_collection = self.get_lod_collection(obj)
+            lod_targets.append((obj_name, lod_collection))
+            build_levels.append(self.remove_outdated_lods(obj, obj_name, lod_collection, source_hash, ratios, lod_pattern))
+
+        lod_mesh_arrays = {}
+        lod_normals = {}
+        
+        if self.mode == "QEM":
+            # decimate every object x missing lod level in worker processes
+            jobs = []
+            job_keys = []
+            for obj_idx, mesh_arrays in enumerate(base_mesh_arrays):
+                tri_count = len(mesh_arrays['triangles'])
+                for lod_idx in build_levels[obj_idx]:
+                    if self.use_max_error:
+                        # search for the lowest triangle count within the error budget of the level
+                        jobs.append((obj_idx, 0, self.get_local_max_error(objs[obj_idx], lod_idx)))
+                    else:
+                        jobs.append((obj_idx, int(tri_count * ratios[lod_idx - 1]), None))
+                    job_keys.append((objs[obj_idx], lod_idx))
+            
+            for key, mesh_arrays in zip(job_keys, decimate_in_processes(base_mesh_arrays, jobs)):
+                lod_mesh_arrays[key] = mesh_arrays
+
+            if self.transfer_normals and self.bake_normals:
+                for obj_idx, obj in enumerate(objs):
+                    if len(build_levels[obj_idx]) > 0:
+                        if armatures[obj_idx] is None:
+                            source_corner_normals = get_evaluated_corner_normals(obj)
+                        else:
+                            source_corner_normals = get_corner_normals(obj.data)
+                        for lod_idx in build_levels[obj_idx]:
+                            key = (obj, lod_idx)
+                            lod_normals[key] = transfer_corner_normals(base_mesh_arrays[obj_idx], source_corner_normals, lod_mesh_arrays[key])
+
+        for obj_idx, obj in enumerate(objs):
+            obj_name, lod_collection = lod_targets[obj_idx]
+            self.generate_lods(obj, obj_name, lod_collection, build_levels[obj_idx], ratios, source_hashes[obj_idx], lod_mesh_arrays, lod_normals, armatures[obj_idx], source_weights.get(obj))
+
+        # focus on all objects in viewport
+        if self.focus_view:
+            for area in bpy.context.screen.areas:
+                if area.type == 'VIEW_3D':
+                    with bpy.context.temp_override(area=area, region=area.regions[-1]):
+                        bpy.ops.view3d.view_selected()  
+
+        return {'FINISHED'}
+
+    # mesh arrays are in local space so the world space error budget is divided by the largest scale
+    def get_local_max_error(self, obj, lod_idx):
+        return self.max_error * self.error_growth ** (lod_idx - 1) / max(max(obj.matrix_world.to_scale()), 1e-6)
+
+    # everything that changes the mesh of a lod level, placement isn't included as it's updated on every run
+    def get_lod_params_hash(self, obj, lod_idx, ratio):
+        # only the options that change the mesh, normals or weights of this lod
+        params = [self.mode, self.transfer_normals]
+        if self.mode == "QEM" and self.transfer_normals:
+            params.append(self.bake_normals)
+        if self.mode == "QEM" and self.use_max_error:
+            params.append(self.get_local_max_error(obj, lod_idx))
+        else:
+            params.append(ratio)
+        if self.reduce_bones and get_armature(obj) is not None:
+            # bones are reduced by lod level
+            params.extend((lod_idx, self.reduced_bone_names))
+        return hashlib.sha1(repr(params).encode()).hexdigest()
+
+    def get_lod_collection(self, obj):
 
         scene = bpy.context.scene
-        obj = bpy.context.object
 
         obj_name = obj.name
         if obj_name.endswith("_LOD0"):
@@ -393,8 +921,6 @@ class Op_GYAZ_Export_GenerateLODs (Operator):
         elif self.suffix_lod0:
             obj.name = obj.name + "_LOD0"
 
-        seam_vert_group_name = None
-
         lod_collection_name = obj_name + "_LODs"
         lod_collection_parent = None
 
@@ -408,34 +934,60 @@ class Op_GYAZ_Export_GenerateLODs (Operator):
         if lod_collection is None:
             lod_collection = bpy.data.collections.new(name=lod_collection_name)
             lod_collection_parent.children.link(lod_collection)
-        for lod_obj in lod_collection.objects:
-            lod_collection.objects.unlink(lod_obj)
-            delete_object(lod_obj)
 
-        if self.mode == "DECIMATE_PRESERVE_SEAMS":
+        return obj_name, lod_collection
+
+    # deletes lods that are out of range or were generated from a different mesh or with different parameters,
+    # returns the lod levels that need to be generated
+    def remove_outdated_lods(self, obj, obj_name, lod_collection, source_hash, ratios, lod_pattern):
+        kept_levels = set()
+        for lod_obj in list(lod_collection.objects):
+            info = get_name_and_lod_index(lod_pattern, lod_obj.name)
+            lod_idx = info[1] if info is not None else 0
+            up_to_date = (
+                1 <= lod_idx <= len(ratios)
+                and lod_idx not in kept_levels
+                and lod_obj.name == obj_name + "_LOD" + str(lod_idx)
+                and lod_obj.get("gyaz_lod_source_hash") == source_hash
+                and lod_obj.get("gyaz_lod_params_hash") == self.get_lod_params_hash(obj, lod_idx, ratios[lod_idx - 1])
+            )
+            if up_to_date:
+                kept_levels.add(lod_idx)
+            else:
+                lod_collection.objects.unlink(lod_obj)
+                delete_object(lod_obj)
+        return [lod_idx for lod_idx in range(1, len(ratios) + 1) if lod_idx not in kept_levels]
+
+    def generate_lods(self, obj, obj_name, lod_collection, build_levels, ratios, source_hash, lod_mesh_arrays, lod_normals, armature, source_weights):
+    
+        data_prefix = "GYAZExporterLOD_"
+
+        seam_vert_group_name = None
+
+        name_filters = [name.strip().lower() for name in self.reduced_bone_names.split(",") if name.strip() != ""]
+
+        if self.mode == "DECIMATE_PRESERVE_SEAMS" and len(build_levels) > 0:
             
+            # recreate the group instead of clearing it vertex by vertex
             seam_vert_group_name = data_prefix + "Seams"
             seam_vert_group = obj.vertex_groups.get(seam_vert_group_name)
-            if seam_vert_group is None:
-                seam_vert_group = obj.vertex_groups.new(name=seam_vert_group_name)
-            else:
-                obj.vertex_groups[seam_vert_group_name].remove([i for i in range(0, len(obj.data.vertices))])
+            if seam_vert_group is not None:
+                obj.vertex_groups.remove(seam_vert_group)
+            seam_vert_group = obj.vertex_groups.new(name=seam_vert_group_name)
 
-            bm = bmesh.new()
-            bm.from_mesh(obj.data)
+            mesh = obj.data
+            edge_count = len(mesh.edges)
+            edge_seams = np.empty(edge_count, dtype=bool)
+            mesh.edges.foreach_get("use_seam", edge_seams)
+            edge_verts = np.empty(edge_count * 2, dtype=np.int32)
+            mesh.edges.foreach_get("vertices", edge_verts)
+            seam_vert_indices = np.unique(edge_verts.reshape(edge_count, 2)[edge_seams])
 
-            seam_vert_indices = []
-            for vert_idx, vert in enumerate(bm.verts):
-                for connected_edge in vert.link_edges:
-                    if connected_edge.seam:
-                        seam_vert_indices.append(vert_idx)
-                        break
-            
-            bm.free()
+            seam_vert_group.add(seam_vert_indices.tolist(), 1.0, "REPLACE")
 
-            seam_vert_group.add(seam_vert_indices, 1.0, "ADD")    
+        for lod_idx in build_levels:
 
-        for lod_idx in range(1, self.lod_count + 1):
+            ratio = ratios[lod_idx - 1]
 
             lod_obj = obj.copy()
 
@@ -444,26 +996,38 @@ class Op_GYAZ_Export_GenerateLODs (Operator):
             lod_obj.name = obj_name + "_LOD" + str(lod_idx)
             lod_obj.show_wire = True
             lod_obj.show_all_edges = True
-            obj_loc = obj.location
-            if self.offset_axis == "X":
-                offset = obj.dimensions[0] * lod_idx + self.lod_spacing * lod_idx
-                lod_obj.location = (obj_loc[0] + offset, obj_loc[1], obj_loc[2])
-            if self.offset_axis == "Y":
-                offset = obj.dimensions[1] * lod_idx + self.lod_spacing * lod_idx
-                lod_obj.location = (obj_loc[0], obj_loc[1] + offset, obj_loc[2])
-            if self.offset_axis == "Z":
-                offset = obj.dimensions[2] * lod_idx + self.lod_spacing * lod_idx
-                lod_obj.location = (obj_loc[0], obj_loc[1], obj_loc[2] + offset)
+            lod_obj["gyaz_lod_source_hash"] = source_hash
+            lod_obj["gyaz_lod_params_hash"] = self.get_lod_params_hash(obj, lod_idx, ratio)
+            # world space error budget, screen sizes use it on export if the lod is too dense to measure
+            if self.mode == "QEM" and self.use_max_error:
+                lod_obj["gyaz_lod_error"] = self.max_error * self.error_growth ** (lod_idx - 1)
+            elif "gyaz_lod_error" in lod_obj:
+                del lod_obj["gyaz_lod_error"]
 
-            m = lod_obj.modifiers.new(name=data_prefix+"EdgeSplit", type="EDGE_SPLIT")
-            m.use_edge_angle = False
+            if self.mode == "QEM":
+                mesh_arrays = lod_mesh_arrays[(obj, lod_idx)]
+                lod_obj.data = make_mesh_from_arrays(lod_obj.name, mesh_arrays, obj.data)
+                if armature is None:
+                    lod_obj.modifiers.clear()
+                    lod_obj.vertex_groups.clear()
+                else:
+                    self.set_lod_weights(lod_obj, armature, obj.vertex_groups.keys(), source_weights[mesh_arrays['vertex_indices']], lod_idx, name_filters)
+                if (obj, lod_idx) in lod_normals:
+                    lod_obj.data.normals_split_custom_set(lod_normals[(obj, lod_idx)].tolist())
             
-            m = lod_obj.modifiers.new(name=data_prefix+"Decimate", type="DECIMATE")
-            ratio = 1.0
-            for x in range(0, lod_idx):
-                ratio /= self.decimation_ratio
-            m.ratio = ratio
-            m.use_collapse_triangulate = True
+            else:
+                if armature is not None and self.reduce_bones:
+                    # weights are stored in the mesh, so reduced bones need a mesh of their own
+                    lod_obj.data = obj.data.copy()
+                    self.set_lod_weights(lod_obj, armature, obj.vertex_groups.keys(), source_weights, lod_idx, name_filters)
+
+                m = lod_obj.modifiers.new(name=data_prefix+"EdgeSplit", type="EDGE_SPLIT")
+                m.use_edge_angle = False
+                
+                m = lod_obj.modifiers.new(name=data_prefix+"Decimate", type="DECIMATE")
+                m.ratio = ratio
+                m.use_collapse_triangulate = True
+
             if self.mode == "DECIMATE_PRESERVE_SEAMS":
                 m.vertex_group = seam_vert_group_name
                 m.invert_vertex_group = True
@@ -474,7 +1038,7 @@ class Op_GYAZ_Export_GenerateLODs (Operator):
                 m.vertex_group = seam_vert_group_name
                 m.invert_vertex_group = False
             
-            if self.transfer_normals:
+            if self.transfer_normals and (obj, lod_idx) not in lod_normals:
                 m = lod_obj.modifiers.new(name=data_prefix+"TransferNormals", type="DATA_TRANSFER")
                 m.use_object_transform = False
                 m.object = obj
@@ -482,14 +1046,28 @@ class Op_GYAZ_Export_GenerateLODs (Operator):
                 m.data_types_loops = {"CUSTOM_NORMAL"}
                 m.loop_mapping = "NEAREST_POLYNOR"
 
-            # focus on all objects in viewport
-            if self.focus_view:
-                for area in bpy.context.screen.areas:
-                    if area.type == 'VIEW_3D':
-                        with bpy.context.temp_override(area=area, region=area.regions[-1]):
-                            bpy.ops.view3d.view_selected()  
+        # kept lods are moved too, spacing and axis don't need a rebuild
+        for lod_idx in range(1, len(ratios) + 1):
+            lod_obj = lod_collection.objects.get(obj_name + "_LOD" + str(lod_idx))
+            if lod_obj is None:
+                continue
+            obj_loc = obj.location
+            if self.offset_axis == "X":
+                offset = obj.dimensions[0] * lod_idx + self.lod_spacing * lod_idx
+                lod_obj.location = (obj_loc[0] + offset, obj_loc[1], obj_loc[2])
+            if self.offset_axis == "Y":
+                offset = obj.dimensions[1] * lod_idx + self.lod_spacing * lod_idx
+                lod_obj.location = (obj_loc[0], obj_loc[1] + offset, obj_loc[2])
+            if self.offset_axis == "Z":
+                offset = obj.dimensions[2] * lod_idx + self.lod_spacing * lod_idx
+                lod_obj.location = (obj_loc[0], obj_loc[1], obj_loc[2] + offset)
+
+    def set_lod_weights(self, lod_obj, armature, group_names, weights, lod_idx, name_filters):
+        if self.reduce_bones:
+            collapse_map = get_bone_collapse_map(armature, name_filters, lod_idx)
+            group_names, weights = collapse_bone_weights(group_names, weights, collapse_map)
+        set_vertex_weights(lod_obj, group_names, weights)
 
-        return {'FINISHED'}
     
     #when the buttons should show up    
     @classmethod
@@ -513,6 +1091,7 @@ def register():
     Scene.gyaz_export_shapes = PointerProperty (type=PG_GYAZ_Export_EncodeShapeKeysInUVChannel)
     
     bpy.utils.register_class (Op_GYAZ_Export_EncodeShapeKeysInUVChannels)
+    bpy.utils.register_class (Op_GYAZ_Export_EncodeShapeKeysInTexture)
     bpy.utils.register_class (Op_GYAZ_Export_GenerateLODs)
 
 
@@ -524,5 +1103,6 @@ def unregister():
     del Scene.gyaz_export_shapes
     
     bpy.utils.unregister_class (Op_GYAZ_Export_EncodeShapeKeysInUVChannels)
+    bpy.utils.unregister_class (Op_GYAZ_Export_EncodeShapeKeysInTexture)
     bpy.utils.unregister_class (Op_GYAZ_Export_GenerateLODs)
     
\ No newline at end of file
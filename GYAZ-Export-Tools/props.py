@@ -177,7 +177,18 @@ class PG_GYAZ_ExportProps (PropertyGroup):
     static_mesh_pack_objects: BoolProperty (name='Pack Objects', default=False, description='Whether to pack all objects into one file or export them as separate files. If true, sockets will not be imported in Unreal')
     skeletal_mesh_pack_objects: BoolProperty (name='Pack Objects', default=False, description='Whether to pack all objects into one file (name of the armature) or export them as separate files (names of mesh children)')
     rigid_anim_pack_objects: BoolProperty (name='Pack Objects', default=False, description="Whether to pack all objects into one file or export them as separate files. If checked, 'Use Scene Start End' is forced, 'Export Cubes' is not an option")
+    rigid_anim_single_sweep: BoolProperty (name='Bake in One Sweep', default=False, description="Sample the world matrices of all objects in one sweep over the frames of their actions and bake them to linear actions without parents, constraints or drivers. The fbx exporter still samples each object's frame range, but only evaluates the baked object. Objects with shape key animation are exported as they are. Not used with Pack Objects")
     pack_actions: BoolProperty (name='Pack Actions', default=False, description='Whether to pack all actions into one file or export them as separate files')
+    animation_workers: IntProperty (name='Worker Processes', default=0, min=0, max=64, description='Split the actions between this many background Blender processes, each opens the saved .blend file and exports its share. 0: export in this Blender. Not used with Pack Actions, Scene Animation or Vertex Animation Textures')
+    scene_shard_frames: IntProperty (name='Shard Frames', default=0, min=0, description='Split a longer scene animation into shards of this many frames, bake them in parallel background Blender processes (Worker Processes of them, all cores if 0) and join them. 0: bake in one piece')
+    use_bake_cache: BoolProperty (name='Bake Cache', default=False, description="Save baked actions next to the exported animations and load them instead of baking again while the action, the rig and the export settings don't change")
+    reduce_keys: BoolProperty (name='Reduce Keys', default=False, description='Remove baked keys that linear interpolation of the remaining keys restores within the tolerances')
+    collapse_static_channels: BoolProperty (name='Collapse Static Channels', default=False, description='Replace the baked keys of channels that stay within the tolerances of one value (or their rest value) with a single key')
+    reduce_keys_location: FloatProperty (name='Location', default=0.01, min=0, precision=3, description='Largest location error in centimeters')
+    reduce_keys_rotation: FloatProperty (name='Rotation', default=0.05, min=0, precision=3, description='Largest rotation error in degrees')
+    reduce_keys_scale: FloatProperty (name='Scale', default=0.001, min=0, precision=4, description='Largest scale error')
+    vertex_animation: BoolProperty (name='Vertex Animation Textures', default=False, description='Instead of bone curves, bake the deformed mesh children of every action to position offset and normal textures (a row block per frame), and export their rest pose as a static mesh with a VertexIndex uv map and a json with the frame ranges')
+    vertex_animation_format: EnumProperty (name='Format', items=(('OPEN_EXR', 'EXR (Float)', 'Offsets are stored as they are, in centimeters'), ('PNG', 'PNG (16 bit)', 'Offsets are remapped to 0-1 between offset_min and offset_max of the json')), default='OPEN_EXR')
 
     static_mesh_clear_transforms: BoolProperty (default=True, name='Clear Transforms', description="Clear object transforms")
     skeletal_clear_transforms: BoolProperty (default=True, name='Clear Transforms', description="Clear object transforms. Armature transformation will always be cleared if root motion is calculated from a bone")
@@ -215,7 +226,13 @@ class PG_GYAZ_ExportProps (PropertyGroup):
     
     export_sockets: BoolProperty (default=True, name='Sockets', description='Sockets are empty objects parented to the object and only work if a file only contains one object. Scale is ignored. Prefix: SOCKET_, Example: Object --> SOCKET_anything. Sockets are gathered automatically and should not be selected')
     
-    export_lods: BoolProperty (default=True, name='LODs', description='Suffix: Obj or Obj_LOD0 --> Obj_LOD1, Obj_LOD2. LODs are gathered automatically and should not be selected. Only static mesh LODs are exported')
+    export_lods: BoolProperty (default=True, name='LODs', description='Suffix: Obj or Obj_LOD0 --> Obj_LOD1, Obj_LOD2. LODs are gathered automatically and should not be selected. Skeletal mesh LODs are exported to separate files (Obj_LOD1, Obj_LOD2) to be imported one by one')
+    
+    lod_screen_sizes: BoolProperty (default=False, name='Screen Sizes', description='Compute LOD screen sizes from the bounding sphere radius and the simplification error of each LOD, the Max Error budget of Generate LODs or measured against LOD0. Written to the custom properties of the LOD group (custom properties are exported with LOD groups) and to a .lods.json file next to the exported file')
+    
+    lod_pixel_error: FloatProperty (default=1.0, min=0.01, name='Pixel Error', description='A LOD is shown once its simplification error is smaller than this many pixels on screen')
+    
+    lod_screen_height: IntProperty (default=1080, min=1, name='Screen Height', description='Screen height in pixels that LOD screen sizes are computed for')
     
     ignore_missing_second_uv_map: BoolProperty (default=False, name='Ignore 2nd UV Check')
     
@@ -271,6 +288,19 @@ class PG_GYAZ_ExportProps (PropertyGroup):
         default=prefs.secondary_bone_axis)
 
     collision_use_selection: BoolProperty(name="Use Selection", description="Add collision around selected vertices, otherwise around the entire object")
+    
+    collision_kdop_planes: EnumProperty(name="k-DOP Planes", 
+        items=(
+            ('10', '10-DOP', 'Box with beveled Z edges'),
+            ('18', '18-DOP', 'Box with all edges beveled'),
+            ('26', '26-DOP', 'Box with all edges and corners beveled')
+            ),
+        default='18',
+        description="Number of planes of k-DOP collision. More planes fit tighter but cost more in physics")
+    
+    simplify_collision_hulls: BoolProperty (default=False, name='Simplify Hulls', description='Simplify convex collision (UCX) objects that are over the hull vertex or face budget. The simplified hull always encloses the original')
+    collision_hull_max_verts: IntProperty (name='Max Verts', default=32, min=4, max=255, description='Vertex budget of convex collision hulls')
+    collision_hull_max_faces: IntProperty (name='Max Faces', default=32, min=4, description='Face budget of convex collision hulls')
 
     # debug
     show_debug_props: BoolProperty (name='Developer', default=False, description="Show properties for debugging")
@@ -262,8 +262,23 @@ class SCENE_PT_GYAZ_Export (Panel):
             col.prop (owner, "static_mesh_clear_transforms")
             col.prop (owner, "static_mesh_vcolors")
             col.prop (owner, "export_collision")
+            if owner.export_collision:
+                row = col.row (align=True)
+                row.label (icon='BLANK1')
+                row.prop (owner, "simplify_collision_hulls")
             col.prop (owner, "export_sockets")
             col.prop (owner, "export_lods")
+            if owner.export_lods:
+                row = col.row (align=True)
+                row.label (icon='BLANK1')
+                row.prop (owner, "lod_screen_sizes")
+                if owner.lod_screen_sizes:
+                    row = col.row (align=True)
+                    row.label (icon='BLANK1')
+                    row.prop (owner, "lod_pixel_error")
+                    row = col.row (align=True)
+                    row.label (icon='BLANK1')
+                    row.prop (owner, "lod_screen_height")
             if owner.check_for_second_uv_map:
                 col.prop (owner, "ignore_missing_second_uv_map")
             col.prop (owner, "export_textures")
@@ -301,15 +316,40 @@ class SCENE_PT_GYAZ_Export (Panel):
             col.prop (owner, "skeletal_clear_transforms")
             col.prop (owner, "skeletal_shapes")
             col.prop (owner, "export_lods")
+            if not owner.vertex_animation:
+                if owner.action_export_mode != "SCENE":
+                    col.prop (owner, "use_bake_cache")
+                col.prop (owner, "reduce_keys")
+                col.prop (owner, "collapse_static_channels")
+                if owner.reduce_keys or owner.collapse_static_channels:
+                    row = col.row (align=True)
+                    row.label (text="", icon="BLANK1")
+                    sub = row.column (align=True)
+                    sub.prop (owner, "reduce_keys_location")
+                    sub.prop (owner, "reduce_keys_rotation")
+                    sub.prop (owner, "reduce_keys_scale")
+            col.prop (owner, "vertex_animation")
+            if owner.vertex_animation:
+                row = col.row (align=True)
+                row.label (text="", icon="BLANK1")
+                row.prop (owner, "vertex_animation_format", text="")
             if owner.action_export_mode == "SCENE":
                 col.label (text="Animation Name:")
                 col.prop (owner, "global_anim_name", text="")
+                if not owner.vertex_animation:
+                    col.prop (owner, "scene_shard_frames")
+                    if owner.scene_shard_frames > 0:
+                        row = col.row (align=True)
+                        row.label (text="", icon="BLANK1")
+                        row.prop (owner, "animation_workers")
             else:
                 col.prop (owner, "pack_actions")
                 if owner.pack_actions:
                     row = col.row(align=True)
                     row.label (text="", icon="BLANK1")
                     row.prop (owner, "global_anim_name", text="")
+                elif not owner.vertex_animation:
+                    col.prop (owner, "animation_workers")
             col.split()
             col.alignment = "RIGHT"
             col.label (text="{0} fps".format(scene.render.fps))
@@ -334,6 +374,7 @@ class SCENE_PT_GYAZ_Export (Panel):
                 row.prop (owner, "rigid_anim_pack_name")
                 message1 = True
             else:
+                col.prop (owner, "rigid_anim_single_sweep")
                 message1 = False
             col.prop (owner, "export_lods")
             col.label (text='Animation Name:')
@@ -421,6 +462,14 @@ class SCENE_PT_GYAZ_Export_Mesh (Panel):
             row.prop(scene.gyaz_export, "collision_use_selection", text="", icon="VERTEXSEL")
             row.operator("object.gyaz_export_add_collision", text="Box").shape = "BOX"
             row.operator("object.gyaz_export_add_collision", text="Sphere").shape = "SPHERE"
+            row = lay.row(align=True)
+            row.prop(scene.gyaz_export, "collision_kdop_planes", text="")
+            row.operator("object.gyaz_export_add_collision", text="k-DOP").shape = "KDOP"
+            col = lay.column(align=True)
+            row = col.row(align=True)
+            row.prop(scene.gyaz_export, "collision_hull_max_verts")
+            row.prop(scene.gyaz_export, "collision_hull_max_faces")
+            col.operator("object.gyaz_export_simplify_collision", text="Simplify Hull")
             lay.operator("object.gyaz_export_bake_collision", text="Bake")
 
             owner = scene.gyaz_export_shapes
@@ -429,7 +478,10 @@ class SCENE_PT_GYAZ_Export_Mesh (Panel):
             row.prop (owner, 'show_props', icon='TRIA_DOWN' if show else 'TRIA_RIGHT', text="", emboss=False)
             row.label (text='Shape Keys in UVs')
             if show:
-                lay.prop (owner, 'encode_normals')
+                row = lay.row (align=True)
+                row.prop (owner, 'encode_normals')
+                if owner.encode_normals:
+                    row.prop (owner, 'octahedral_normals')
                 col = lay.column (align=True)
                 col.label (text='Base:')
                 col.prop (owner, 'base_mesh', text='')
@@ -451,7 +503,7 @@ class SCENE_PT_GYAZ_Export_Mesh (Panel):
                     col.prop (owner, 'shape_key_mesh_5', text='')
                 else:
                     col = lay.column (align=True)
-                    col.label (text='Shape 3 (No Normals):')
+                    col.label (text='Shape 3:' if owner.octahedral_normals else 'Shape 3 (No Normals):')
                     col.prop (owner, 'shape_key_mesh_3', text='')            
                 col = lay.column (align=True)
                 col.label (text='Shape Normal To Vert Color:')
@@ -459,6 +511,14 @@ class SCENE_PT_GYAZ_Export_Mesh (Panel):
                 lay.separator ()
                 lay.operator ('object.gyaz_export_encode_shape_keys_in_uv_channels', text='Encode', icon='SHAPEKEY_DATA')
                 lay.separator ()
+                col = lay.column (align=True)
+                col.label (text='Texture (Selected Shape Meshes):')
+                row = col.row (align=True)
+                row.prop (owner, 'texture_format', text='')
+                row.prop (owner, 'texture_normals', toggle=True)
+                col.prop (owner, 'texture_folder', text='')
+                col.operator ('object.gyaz_export_encode_shape_keys_in_texture', text='Encode In Texture', icon='TEXTURE')
+                lay.separator ()
                 row = lay.row (align=True)
                 row.scale_y = 2
                 row.operator ('object.gyaz_export_export', text='EXPORT', icon='EXPORT')
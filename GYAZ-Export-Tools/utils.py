@@ -201,6 +201,18 @@ def get_bbox_and_dimensions (vectors):
     return bbox, dimensions
 
 
+def get_vert_positions (mesh):
+    positions = np.empty (len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get ("co", positions)
+    return positions.reshape (-1, 3)
+
+
+def get_selected_vert_mask (mesh):
+    mask = np.empty (len(mesh.vertices), dtype=bool)
+    mesh.vertices.foreach_get ("select", mask)
+    return mask
+
+
 def get_dimensions(vectors):
     x_vectors = [vec[0] for vec in vectors]
     y_vectors = [vec[1] for vec in vectors]
@@ -219,18 +231,396 @@ def get_dimensions(vectors):
 # remove rotation form selected collision objects keeping scale intact
 def bake_collision_object(obj):
     mesh = obj.data
-    vertices = mesh.vertices
     
-    # calc vert positions as if rotation and scale was applied
-    matrix = obj.matrix_world
+    # calc vert positions as if rotation and scale was applied,
+    # translation doesn't change dimensions so only the 3x3 part is used
+    matrix = np.array (obj.matrix_world, dtype=np.float32)[:3, :3]
     location = Vector(obj.location)
-    original_vert_coords = [Vector(vert.co) for vert in vertices]
-    applied_verts = [(matrix @ co) - location for co in original_vert_coords]
+    applied_coords = get_vert_positions (mesh) @ matrix.T
     obj.matrix_world.identity()
     obj.location = location
     
-    # reapply scale
-    dims = get_dimensions(applied_verts)
-    for i in range(0, len(vertices)):
-        vertices[i].co = original_vert_coords[i]
-    obj.scale = dims
+    # reapply scale, vertex coordinates are left untouched
+    if len (applied_coords) > 0:
+        obj.scale = np.ptp (applied_coords, axis=0)
+
+
+# screen size (bounding sphere diameter / screen height, as in Unreal) at which the simplification error
+# of each lod is pixel_error pixels on a screen_height tall screen, the field of view cancels out,
+# radii: (n,), errors: (n, lod_count) for lod1 and up, returns (n, lod_count + 1) starting with 1.0 for lod0
+def get_lod_screen_sizes(radii, errors, pixel_error, screen_height):
+    with np.errstate (divide='ignore', invalid='ignore'):
+        sizes = 2 * radii[:, np.newaxis] * pixel_error / (errors * screen_height)
+    sizes = np.clip (np.nan_to_num (sizes, nan=0.0, posinf=1.0), 0, 1)
+    # a lod never switches at a larger size than the previous one
+    sizes = np.minimum.accumulate (sizes, axis=1)
+    return np.concatenate ((np.ones ((len (radii), 1)), sizes), axis=1)
+
+
+def get_evaluation_dependencies(objects):
+    # objects, their parents, constraint and driver targets, recursively
+    dependencies = set()
+    stack = list(objects)
+    while len(stack) > 0:
+        obj = stack.pop()
+        if not isinstance(obj, bpy.types.Object) or obj in dependencies:
+            continue
+        dependencies.add(obj)
+        stack.append(obj.parent)
+
+        constraints = list(obj.constraints)
+        if obj.type == 'ARMATURE':
+            for pbone in obj.pose.bones:
+                constraints.extend(pbone.constraints)
+        for c in constraints:
+            stack.append(getattr(c, 'target', None))
+            stack.append(getattr(c, 'pole_target', None))
+            for target in getattr(c, 'targets', ()):
+                stack.append(target.target)
+
+        if obj.animation_data is not None:
+            for fcurve in obj.animation_data.drivers:
+                for var in fcurve.driver.variables:
+                    for target in var.targets:
+                        stack.append(target.id)
+    return dependencies
+
+
+def isolate_evaluation(objects):
+    # only objects (and what they depend on) need to be evaluated while baking, exclude collections and hide objects
+    # without them and disable armature modifiers, returns what to restore
+    dependencies = get_evaluation_dependencies(objects)
+    excluded_collections = []
+    hidden_objects = []
+    disabled_modifiers = []
+
+    def exclude_recursive(layer_collection):
+        for child in layer_collection.children:
+            if child.exclude:
+                continue
+            if dependencies.isdisjoint(child.collection.all_objects):
+                child.exclude = True
+                excluded_collections.append(child)
+            else:
+                exclude_recursive(child)
+
+    exclude_recursive(bpy.context.view_layer.layer_collection)
+
+    for obj in bpy.context.view_layer.objects:
+        if obj not in dependencies:
+            if not obj.hide_viewport:
+                obj.hide_viewport = True
+                hidden_objects.append(obj)
+            if obj.type == 'MESH':
+                for modifier in obj.modifiers:
+                    if modifier.type == 'ARMATURE' and modifier.show_viewport:
+                        modifier.show_viewport = False
+                        disabled_modifiers.append(modifier)
+
+    return excluded_collections, hidden_objects, disabled_modifiers
+
+
+def restore_evaluation(isolation):
+    excluded_collections, hidden_objects, disabled_modifiers = isolation
+    for layer_collection in reversed(excluded_collections):
+        layer_collection.exclude = False
+    for obj in hidden_objects:
+        obj.hide_viewport = False
+    for modifier in disabled_modifiers:
+        modifier.show_viewport = True
+
+
+# shards: (frames, values of shape (channel_count, frame_count)) baked over overlapping frame ranges,
+# cores: (first, last) frame each shard contributes, quaternion_groups: channel indices of a quaternion (w, x, y, z),
+# returns frames, values and the largest difference of the shards where they overlap
+def stitch_frame_shards(shards, cores, quaternion_groups):
+    stitched_frames = []
+    stitched_values = []
+    seam_error = 0.0
+    previous = None
+
+    for (frames, values), (first, last) in zip(shards, cores):
+        values = values.copy()
+        if previous is not None:
+            previous_frames, previous_values = previous
+            overlap = np.intersect1d(previous_frames, frames)
+            a = previous_values[:, np.searchsorted(previous_frames, overlap)]
+            b = values[:, np.searchsorted(frames, overlap)]
+            # q and -q are the same rotation, keep the sign of the previous shard so the curves don't jump
+            for group in quaternion_groups:
+                if np.sum(a[group] * b[group]) < 0:
+                    values[group] *= -1
+                    b[group] *= -1
+            if len(overlap) > 0:
+                seam_error = max(seam_error, float(np.abs(a - b).max(initial=0.0)))
+
+        core = (frames >= first) & (frames <= last)
+        stitched_frames.append(frames[core])
+        stitched_values.append(values[:, core])
+        previous = (frames, values)
+
+    return np.concatenate(stitched_frames), np.concatenate(stitched_values, axis=1), seam_error
+
+
+# keys of every fcurve of a baked action (a key on every frame) interpolated to frames,
+# returns (data_paths, array_indices, group_names, values of shape (fcurve_count, frame_count))
+def get_action_samples(action, frames):
+    data_paths = []
+    array_indices = []
+    group_names = []
+    values = np.empty((len(action.fcurves), len(frames)))
+    for fcurve_idx, fcurve in enumerate(action.fcurves):
+        co = np.empty(len(fcurve.keyframe_points) * 2)
+        fcurve.keyframe_points.foreach_get("co", co)
+        co = co.reshape(-1, 2)
+        values[fcurve_idx] = np.interp(frames, co[:, 0], co[:, 1])
+        data_paths.append(fcurve.data_path)
+        array_indices.append(fcurve.array_index)
+        group_names.append(fcurve.group.name if fcurve.group is not None else "")
+    return data_paths, array_indices, group_names, values
+
+
+# new action with a key on every frame for each fcurve, the inverse of get_action_samples
+def make_action_from_samples(name, data_paths, array_indices, group_names, frames, values):
+    action = bpy.data.actions.new(name=name)
+    co = np.empty((len(frames), 2))
+    co[:, 0] = frames
+    for data_path, array_index, group_name, fcurve_values in zip(data_paths, array_indices, group_names, values):
+        fcurve = action.fcurves.new(data_path, index=array_index, action_group=group_name)
+        fcurve.keyframe_points.add(len(frames))
+        co[:, 1] = fcurve_values
+        fcurve.keyframe_points.foreach_set("co", co.ravel())
+        fcurve.update()
+    return action
+
+
+# channel indices of each quaternion rotation, in w, x, y, z order
+def get_quaternion_groups(data_paths, array_indices):
+    groups = {}
+    for channel_idx, (data_path, array_index) in enumerate(zip(data_paths, array_indices)):
+        if data_path.endswith("rotation_quaternion"):
+            groups.setdefault(data_path, {})[array_index] = channel_idx
+    return [[group[i] for i in range(4)] for group in groups.values() if len(group) == 4]
+
+
+# keys (a mask of shape (channel_count, frame_count)) that linearly interpolate values within tolerances (channel_count,),
+# the key with the largest error of every segment is added until no segment has a larger error than its tolerance
+def reduce_keyframes(frames, values, tolerances):
+    channel_count, frame_count = values.shape
+    frames = np.asarray(frames, dtype=np.float64)
+    keep = np.zeros((channel_count, frame_count), dtype=bool)
+    keep[:, [0, -1]] = True
+    # channels that may still have segments with too large errors
+    active = np.arange(channel_count)
+
+    while len(active) > 0:
+        active_keep = keep[active]
+        active_values = values[active]
+        rows = np.arange(len(active))[:, None]
+        frame_indices = np.broadcast_to(np.arange(frame_count), active_keep.shape)
+
+        # previous and next key of every frame
+        prev_key = np.maximum.accumulate(np.where(active_keep, frame_indices, 0), axis=1)
+        next_key = np.minimum.accumulate(np.where(active_keep, frame_indices, frame_count - 1)[:, ::-1], axis=1)[:, ::-1]
+        t = (frames - frames[prev_key]) / np.maximum(frames[next_key] - frames[prev_key], 1e-12)
+        error = np.abs(active_values - (active_values[rows, prev_key] + (active_values[rows, next_key] - active_values[rows, prev_key]) * t))
+        error[error <= tolerances[active][:, None]] = 0
+
+        # a segment runs from a key to the next one, the frame with the largest error of every segment becomes a key
+        error = error.ravel()
+        segment_starts = np.flatnonzero(active_keep.ravel())
+        segment_max = np.maximum.reduceat(error, segment_starts)
+        segment_max = np.repeat(segment_max, np.diff(np.append(segment_starts, len(error))))
+        worst = (error == segment_max) & (error > 0)
+        active_keep.ravel()[worst] = True
+
+        keep[active] = active_keep
+        active = active[worst.reshape(-1, frame_count).any(axis=1)]
+
+    return keep
+
+
+# tolerance of every channel in the units of its values, location_tolerance is in centimeters 
+# (bone locations of the final rig, object locations in meters), rotation_tolerance in degrees
+def get_channel_tolerances(data_paths, location_tolerance, rotation_tolerance, scale_tolerance):
+    tolerances = np.zeros(len(data_paths))
+    for channel_idx, data_path in enumerate(data_paths):
+        if data_path.endswith("location"):
+            tolerances[channel_idx] = location_tolerance if data_path.startswith("pose.bones") else location_tolerance / 100
+        elif data_path.endswith("rotation_quaternion"):
+            # a quaternion component changes about half as much as the angle
+            tolerances[channel_idx] = np.radians(rotation_tolerance) / 2
+        elif data_path.endswith("rotation_euler") or data_path.endswith("rotation_axis_angle"):
+            tolerances[channel_idx] = np.radians(rotation_tolerance)
+        elif data_path.endswith("scale"):
+            tolerances[channel_idx] = scale_tolerance
+    return tolerances
+
+
+# frames and values of every fcurve of a baked action from its first to its last frame
+def get_baked_action_samples(action):
+    frame_start, frame_end = action.frame_range
+    frames = np.arange(int(frame_start), int(frame_end) + 1)
+    return (frames,) + get_action_samples(action, frames)
+
+
+# removes keys of a baked action (a key on every frame) that linear interpolation restores within tolerances,
+# returns the removed key count
+def reduce_action_keys(action, location_tolerance, rotation_tolerance, scale_tolerance):
+    frames, data_paths, array_indices, group_names, values = get_baked_action_samples(action)
+    if len(data_paths) == 0 or len(frames) < 3:
+        return 0
+
+    tolerances = get_channel_tolerances(data_paths, location_tolerance, rotation_tolerance, scale_tolerance)
+    keep = reduce_keyframes(frames, values, tolerances)
+
+    removed_count = 0
+    for fcurve, channel_keep, channel_values in zip(action.fcurves, keep, values):
+        key_count = len(fcurve.keyframe_points)
+        co = np.stack((frames[channel_keep], channel_values[channel_keep]), axis=1)
+        if len(co) >= key_count:
+            continue
+        fcurve.keyframe_points.clear()
+        fcurve.keyframe_points.add(len(co))
+        fcurve.keyframe_points.foreach_set("co", co.ravel())
+        # LINEAR, errors were measured against linear interpolation
+        fcurve.keyframe_points.foreach_set("interpolation", np.ones(len(co), dtype=np.int32))
+        fcurve.update()
+        removed_count += key_count - len(co)
+    return removed_count
+
+
+# value of a channel in rest pose, None if it has no rest value
+def get_rest_value(data_path, array_index):
+    if data_path.endswith("location") or data_path.endswith("rotation_euler"):
+        return 0.0
+    elif data_path.endswith("rotation_quaternion") or data_path.endswith("rotation_axis_angle"):
+        # w of the identity quaternion, y of the axis, the angle is 0
+        if data_path.endswith("rotation_quaternion"):
+            return 1.0 if array_index == 0 else 0.0
+        return 1.0 if array_index == 2 else 0.0
+    elif data_path.endswith("scale"):
+        return 1.0
+    return None
+
+
+# replaces the keys of channels of a baked action that stay within tolerance of a value by a single key,
+# returns (collapsed channel count, how many of them are at their rest value, removed key count)
+def collapse_static_channels(action, location_tolerance, rotation_tolerance, scale_tolerance):
+    frames, data_paths, array_indices, group_names, values = get_baked_action_samples(action)
+    if len(data_paths) == 0:
+        return 0, 0, 0
+
+    tolerances = get_channel_tolerances(data_paths, location_tolerance, rotation_tolerance, scale_tolerance)
+    value_min = values.min(axis=1)
+    value_max = values.max(axis=1)
+    static = value_max - value_min <= tolerances * 2
+    # keep the length of the action even if every channel ends up with one key
+    action.use_frame_range = True
+    action.frame_start = frames[0]
+    action.frame_end = frames[-1]
+    constant_values = (value_min + value_max) / 2
+    rest_values = np.array([np.nan if value is None else value for value in map(get_rest_value, data_paths, array_indices)])
+    at_rest = static & (np.maximum(np.abs(value_min - rest_values), np.abs(value_max - rest_values)) <= tolerances)
+    # snap to rest so the channel matches the rest pose exactly
+    constant_values[at_rest] = rest_values[at_rest]
+
+    removed_count = 0
+    for fcurve, channel_static, value in zip(action.fcurves, static, constant_values):
+        key_count = len(fcurve.keyframe_points)
+        if not channel_static or key_count <= 1:
+            continue
+        fcurve.keyframe_points.clear()
+        fcurve.keyframe_points.insert(frames[0], value)
+        fcurve.update()
+        removed_count += key_count - 1
+    return int(static.sum()), int(at_rest.sum()), removed_count
+
+
+# samples of every fcurve of a baked action to an .npz file
+def save_action_samples(filepath, action):
+    frames, data_paths, array_indices, group_names, values = get_baked_action_samples(action)
+    np.savez(filepath, frames=frames, values=values, data_paths=np.array(data_paths, dtype=str), 
+             array_indices=np.array(array_indices, dtype=np.int32), group_names=np.array(group_names, dtype=str))
+
+
+# new action from samples saved by save_action_samples
+def load_action_samples(filepath, name):
+    with np.load(filepath) as data:
+        return make_action_from_samples(name, data["data_paths"].tolist(), data["array_indices"].tolist(), 
+                                        data["group_names"].tolist(), data["frames"], data["values"])
+
+
+# adds every property value of an rna struct to a hashlib hash, ID pointers by name,
+# collections (like the targets of armature constraints or driver variables) item by item
+def hash_rna_properties(h, struct):
+    for prop in struct.bl_rna.properties:
+        if prop.identifier == "rna_type":
+            continue
+        value = getattr(struct, prop.identifier, None)
+        if prop.type == 'COLLECTION':
+            for item in value:
+                hash_rna_properties(h, item)
+            continue
+        if prop.type == 'POINTER':
+            value = value.name if isinstance(value, bpy.types.ID) else None
+        elif type(value).__name__ == 'bpy_prop_array':
+            value = np.array(value).tolist()
+        h.update((prop.identifier + "=" + repr(value) + ";").encode())
+
+
+# bone names the fcurves of an action animate, parsed once and cached per action until its fcurve count changes
+_action_bone_names = {}
+_bone_data_path_pattern = re.compile(r'pose\.bones\["((?:[^"\\]|\\.)*)"\]')
+
+def get_action_bone_names(action):
+    fcurve_count = len(action.fcurves)
+    cached = _action_bone_names.get(action.session_uid)
+    if cached is None or cached[0] != fcurve_count:
+        bone_names = set()
+        for fcurve in action.fcurves:
+            match = _bone_data_path_pattern.match(fcurve.data_path)
+            if match is not None:
+                bone_names.add(bpy.utils.unescape_identifier(match.group(1)))
+        cached = (fcurve_count, frozenset(bone_names))
+        _action_bone_names[action.session_uid] = cached
+    return cached[1]
+
+
+def action_animates_rig(action, rig):
+    return any(name in rig.data.bones for name in get_action_bone_names(action))
+
+
+# translations, XYZ euler rotations in radians and scales of (object_count, frame_count, 4, 4) matrices,
+# eulers are chosen frame by frame to be the closest to the previous ones, like to_euler with a compatible euler
+def decompose_matrices(matrices):
+    translations = matrices[..., :3, 3]
+    axes = matrices[..., :3, :3]
+    scales = np.linalg.norm(axes, axis=-2)
+    # a negative scale is put on x
+    scales[..., 0] *= np.sign(np.linalg.det(axes))
+    rotations = axes / np.where(np.abs(scales) > 1e-12, scales, 1)[..., None, :]
+
+    # the two euler solutions of every rotation
+    y = np.arcsin(np.clip(-rotations[..., 2, 0], -1, 1))
+    cos_y = np.sqrt(rotations[..., 0, 0] ** 2 + rotations[..., 1, 0] ** 2)
+    gimbal = cos_y < 1e-6
+    x = np.where(gimbal, np.arctan2(-rotations[..., 1, 2], rotations[..., 1, 1]), np.arctan2(rotations[..., 2, 1], rotations[..., 2, 2]))
+    z = np.where(gimbal, 0, np.arctan2(rotations[..., 1, 0], rotations[..., 0, 0]))
+    euler_a = np.stack((x, y, z), axis=-1)
+    euler_b = np.stack((x + np.pi, np.pi - y, z + np.pi), axis=-1)
+
+    eulers = np.empty_like(euler_a)
+    previous = euler_a[:, 0]
+    for frame_idx in range(euler_a.shape[1]):
+        candidates = []
+        for euler in (euler_a[:, frame_idx], euler_b[:, frame_idx]):
+            # closest 2 pi turn of every angle
+            euler = euler + np.round((previous - euler) / (2 * np.pi)) * 2 * np.pi
+            candidates.append(euler)
+        distance_a = np.abs(candidates[0] - previous).sum(axis=-1)
+        distance_b = np.abs(candidates[1] - previous).sum(axis=-1)
+        previous = np.where((distance_b < distance_a)[:, None], candidates[1], candidates[0])
+        eulers[:, frame_idx] = previous
+
+    return translations, eulers, scales
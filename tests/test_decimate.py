@@ -0,0 +1,111 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# decimate.py doesn't import bpy, it's tested without Blender
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "GYAZ-Export-Tools"))
+
+import decimate
+
+
+def make_grid(size, height=0.0, island_offset=None):
+    # a (size x size) quad grid on the unit square, split into triangles, with uv = xy,
+    # island_offset moves the uvs of the triangles right of x = 0.5 to a separate uv island
+    coords = np.linspace(0, 1, size + 1)
+    x, y = np.meshgrid(coords, coords, indexing='ij')
+    z = height * np.sin(6 * x) * np.cos(5 * y)
+    positions = np.stack((x.ravel(), y.ravel(), z.ravel()), axis=1)
+    verts = np.arange((size + 1) ** 2).reshape(size + 1, size + 1)
+    a, b, c, d = verts[:-1, :-1].ravel(), verts[1:, :-1].ravel(), verts[1:, 1:].ravel(), verts[:-1, 1:].ravel()
+    triangles = np.concatenate((np.stack((a, b, c), axis=1), np.stack((a, c, d), axis=1)))
+    uvs = positions[triangles][:, :, :2].copy()
+    if island_offset is not None:
+        right = positions[triangles][:, :, 0].mean(axis=1) > 0.5
+        uvs[right] += island_offset
+    return {
+        'positions': positions,
+        'triangles': triangles,
+        'uvs': uvs[np.newaxis],
+        'materials': np.zeros(len(triangles), dtype=np.int64),
+        'smooth': np.ones(len(triangles), dtype=bool),
+        'seam_edges': np.zeros((0, 2), dtype=np.int64),
+        'sharp_edges': np.zeros((0, 2), dtype=np.int64),
+    }
+
+
+class DecimateTest(unittest.TestCase):
+
+    def assert_valid_mesh(self, mesh_arrays):
+        triangles = mesh_arrays['triangles']
+        self.assertTrue(np.all((triangles >= 0) & (triangles < len(mesh_arrays['positions']))))
+        self.assertTrue(np.all((triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 2] != triangles[:, 0])))
+        self.assertEqual(mesh_arrays['uvs'].shape[1], len(triangles))
+        self.assertEqual(len(mesh_arrays['materials']), len(triangles))
+
+    def test_target_triangle_count(self):
+        mesh_arrays = make_grid(40, height=0.05)
+        result = decimate.decimate(mesh_arrays, 800)
+        self.assert_valid_mesh(result)
+        # a collapse removes up to two triangles
+        self.assertIn(len(result['triangles']), (799, 800))
+        self.assertLess(decimate.hausdorff_distance(mesh_arrays, result), 0.01)
+
+    def test_uv_seam_is_kept(self):
+        mesh_arrays = make_grid(30, height=0.05, island_offset=2.0)
+        result = decimate.decimate(mesh_arrays, 200)
+        self.assert_valid_mesh(result)
+        self.assertLess(len(result['triangles']), 300)
+
+        # every triangle stays in one uv island, on its side of the seam
+        uvs = result['uvs'][0]
+        corners = result['positions'][result['triangles']]
+        right = uvs[:, :, 0] > 1.5
+        self.assertTrue(np.all(right.all(axis=1) | ~right.any(axis=1)))
+        self.assertTrue(np.all(corners[right.all(axis=1)][:, :, 0] >= 0.5 - 1e-9))
+        self.assertTrue(np.all(corners[~right.any(axis=1)][:, :, 0] <= 0.5 + 1e-9))
+
+    def test_uvs_follow_positions(self):
+        # on a flat grid with uv = xy, the remapped uvs of every corner are still the xy of its vertex
+        mesh_arrays = make_grid(24)
+        result = decimate.decimate(mesh_arrays, 150)
+        self.assert_valid_mesh(result)
+        corners = result['positions'][result['triangles']]
+        np.testing.assert_allclose(result['uvs'][0], corners[:, :, :2], atol=1e-9)
+
+    def test_marked_edges_are_carried(self):
+        mesh_arrays = make_grid(20, height=0.05)
+        # a sharp line across the grid at y = 0.5
+        verts = np.arange(21 * 21).reshape(21, 21)
+        mesh_arrays['sharp_edges'] = np.stack((verts[:-1, 10], verts[1:, 10]), axis=1)
+        result = decimate.decimate(mesh_arrays, 200)
+        self.assert_valid_mesh(result)
+
+        sharp_edges = result['sharp_edges']
+        self.assertGreater(len(sharp_edges), 0)
+        self.assertTrue(np.allclose(result['positions'][sharp_edges][:, :, 1], 0.5))
+        edge_keys = decimate.encode_edges(result['triangles'][:, [0, 1, 1, 2, 2, 0]], len(result['positions']))
+        self.assertTrue(np.all(np.isin(decimate.encode_edges(sharp_edges, len(result['positions'])), edge_keys)))
+
+    def test_mesh_without_triangles(self):
+        mesh_arrays = make_grid(2)
+        mesh_arrays['triangles'] = np.zeros((0, 3), dtype=np.int64)
+        mesh_arrays['uvs'] = np.zeros((1, 0, 3, 2))
+        mesh_arrays['materials'] = np.zeros(0, dtype=np.int64)
+        mesh_arrays['smooth'] = np.zeros(0, dtype=bool)
+        result = decimate.decimate(mesh_arrays, 0)
+        self.assertEqual(len(result['triangles']), 0)
+        np.testing.assert_array_equal(result['vertex_indices'], np.arange(len(mesh_arrays['positions'])))
+
+    def test_decimate_to_error(self):
+        mesh_arrays = make_grid(30, height=0.05)
+        max_error = 0.002
+        result = decimate.decimate_to_error(mesh_arrays, max_error)
+        self.assert_valid_mesh(result)
+        self.assertLess(len(result['triangles']), len(mesh_arrays['triangles']) // 2)
+        self.assertLessEqual(decimate.hausdorff_distance(mesh_arrays, result), max_error)
+
+
+if __name__ == "__main__":
+    unittest.main()